@@ -3,4 +3,65 @@
 # Date:
 # ----------------------
 
+import random
 
+# Optional timing traces (see Pygal/instrumentation.py). If that file isn't on
+# the import path, e.g. PYTHONPATH=../Pygal, the program runs untraced.
+try:
+    from instrumentation import traced
+except ImportError:
+    def traced(stage, steps=None, output=None):
+        return lambda function: function
+
+
+# ── PART A: THE DICE MODEL ────────────────────────────────────────────────────
+# Rolls a six-sided dice using a random number generator.
+#
+# Returns: a random whole number from 1 to 6
+def roll_dice():
+    return random.randint(1, 6)
+
+
+# A guess is only valid if it is a whole number from 1 to 6.
+# Text like "4" is accepted as long as it holds a whole number.
+#
+# Returns: True if the guess can be used, otherwise False
+def is_valid_guess(guess):
+    if isinstance(guess, bool):
+        return False
+    if isinstance(guess, str):
+        guess = guess.strip()
+        if not guess.isdigit():
+            return False
+        guess = int(guess)
+    if not isinstance(guess, int):
+        return False
+    return 1 <= guess <= 6
+
+
+# Rolls the dice and checks the user's guess against it.
+#
+# Parameters:
+#   guess - the user's guess (1-6)
+#
+# Returns: True if the guess matched the roll, False if it didn't
+#          (an invalid guess is reported and counts as incorrect)
+@traced("simulate")
+def check_guess(guess):
+    if not is_valid_guess(guess):
+        print(f"Invalid guess: {guess!r} - please guess a whole number from 1 to 6")
+        return False
+
+    roll = roll_dice()
+    return int(guess) == roll
+
+
+# ── PART B: TESTING ───────────────────────────────────────────────────────────
+# A mix of valid and invalid guesses to check the program behaves as expected.
+# (Only runs when this file is run directly, not when it is imported.)
+user_inputs = [1, 3, 6, 0, 7, -2, 2.5, "4", "six", None]
+
+if __name__ == "__main__":
+    for user_input in user_inputs:
+        result = check_guess(user_input)
+        print(f"Guess {user_input!r}: {'Correct!' if result else 'Incorrect'}")
@@ -3,4 +3,529 @@
 # Date:
 # ---------------
 
+import math
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
+
+# Optional timing traces (see Pygal/instrumentation.py). If that file isn't on
+# the import path, e.g. PYTHONPATH=../Pygal, the program runs untraced.
+try:
+    from instrumentation import traced
+except ImportError:
+    def traced(stage, steps=None, output=None):
+        return lambda function: function
+
+# Shards are analysed on several CPU cores with map_jobs from Pygal/parallel.py,
+# which also lets the worker processes load this script when a tool loaded it
+# by path (parallel.load_script). Without the Pygal folder on the import path,
+# a plain process pool does the same job.
+try:
+    from parallel import map_jobs
+except ImportError:
+    def map_jobs(worker, jobs, workers=None):
+        jobs = list(jobs)
+        if len(jobs) <= 1 or workers == 1:
+            return [worker(*job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(worker, *zip(*jobs)))
+
+CSV_HEADER = "Dice Result,User Guess,Guess Correct\n"
+
+
+# ── CHUNKED ROLL GENERATOR ────────────────────────────────────────────────────
+# Rolling one dice at a time in a Python loop is far too slow for a billion
+# rolls. This generator rolls a whole chunk of dice at once as a NumPy array,
+# along with the user's guesses, and works out which guesses were correct.
+# Only one chunk exists in memory at a time.
+#
+# Parameters:
+#   total_rolls - how many rolls to make altogether
+#   seed        - seed for the random number generator (same seed = same rolls)
+#   user_guess  - a hardcoded guess used for every roll, or None to draw a
+#                 random guess for each roll. Like is_valid_guess in 9.1, it must
+#                 be a whole number from 1 to 6 (or text such as "3").
+#   chunk_size  - how many rolls to make at once
+#
+# Yields: (results, guesses, correct) arrays for each chunk
+def generate_roll_chunks(total_rolls, seed=None, user_guess=None, chunk_size=1_000_000):
+    if user_guess is not None:
+        if isinstance(user_guess, str) and user_guess.strip().isdigit():
+            user_guess = int(user_guess)
+        if (isinstance(user_guess, bool) or not isinstance(user_guess, (int, np.integer))
+                or not 1 <= user_guess <= 6):
+            raise ValueError(f"user_guess must be a whole number from 1 to 6, got {user_guess!r}")
+
+    rng = np.random.default_rng(seed)
+    remaining = total_rolls
+
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        results = rng.integers(1, 7, size=size, dtype=np.uint8)
+        if user_guess is None:
+            guesses = rng.integers(1, 7, size=size, dtype=np.uint8)
+        else:
+            guesses = np.full(size, user_guess, dtype=np.uint8)
+
+        yield results, guesses, results == guesses
+        remaining -= size
+
+
+# ── RUNNING TOTALS ────────────────────────────────────────────────────────────
+# Keeps count of how often each face came up and how many guesses were
+# correct, so the summary is ready without re-reading the CSV file.
+def new_summary():
+    return {"rolls": 0, "hits": 0, "face_counts": [0] * 6}
+
+
+# Adds one chunk of rolls to the running totals
+def update_summary(summary, results, correct):
+    counts = np.bincount(results, minlength=7)[1:7]
+    summary["rolls"] += int(results.size)
+    summary["hits"] += int(np.count_nonzero(correct))
+    summary["face_counts"] = [total + int(count) for total, count in zip(summary["face_counts"], counts)]
+    return summary
+
+
+# Returns the fraction of guesses that were correct (expected: 1/6 ≈ 0.167)
+def hit_rate(summary):
+    return summary["hits"] / summary["rolls"] if summary["rolls"] else 0.0
+
+
+# ── CHI-SQUARE TEST ───────────────────────────────────────────────────────────
+# Tests whether the face counts look like a fair dice. For each face we compare
+# the observed count with the expected count (rolls / 6):
+#   chi-square = sum of (observed - expected)² / expected
+# A fair dice gives a small value. The p-value is the chance a fair dice would
+# give a value at least this large — below 0.05 suggests the dice is biased.
+#
+# With 6 faces there are 5 degrees of freedom, and for an odd number of degrees
+# of freedom the p-value has an exact formula using the error function.
+#
+# Returns: (chi_square, p_value)
+def chi_square_test(face_counts):
+    rolls = sum(face_counts)
+    if rolls == 0:
+        return 0.0, 1.0
+
+    expected = rolls / 6
+    chi_square = sum((count - expected) ** 2 / expected for count in face_counts)
+
+    half = chi_square / 2
+    p_value = math.erfc(math.sqrt(half)) + math.sqrt(2 * chi_square / math.pi) \
+        * math.exp(-half) * (1 + chi_square / 3)
+    return chi_square, min(p_value, 1.0)
+
+
+# ── STREAMING CSV WRITER ──────────────────────────────────────────────────────
+# There are only 72 possible rows (6 results × 6 guesses × True/False), so each
+# one is written out once in advance. A chunk is turned into text by looking up
+# its rows in this table, and is written to the file before the next chunk is
+# rolled — memory use stays the same however many rolls there are.
+ROW_TABLE = np.array([
+    f"{result},{guess},{correct}\n".encode()
+    for result in range(1, 7)
+    for guess in range(1, 7)
+    for correct in (False, True)
+], dtype=object)
+
+
+# Position of each row in ROW_TABLE
+def row_index(results, guesses, correct):
+    return ((results.astype(np.intp) - 1) * 6 + (guesses - 1)) * 2 + correct
+
+
+# Parameters:
+#   path        - the CSV file to write
+#   total_rolls - how many rolls to make
+#   seed        - seed for the random number generator
+#   user_guess  - hardcoded guess, or None for random guesses
+#   chunk_size  - how many rows are held in memory before being written
+#
+# Returns: the summary dictionary (rolls, hits and face_counts)
+@traced("simulate", steps="total_rolls", output="path")
+def stream_rolls_to_csv(path, total_rolls, seed=None, user_guess=None, chunk_size=1_000_000):
+    summary = new_summary()
+
+    with open(path, "wb") as csv_file:
+        csv_file.write(CSV_HEADER.encode())
+
+        for results, guesses, correct in generate_roll_chunks(total_rolls, seed, user_guess, chunk_size):
+            rows = ROW_TABLE[row_index(results, guesses, correct)]
+            csv_file.write(b"".join(rows))
+            update_summary(summary, results, correct)
+
+    return summary
+
+
+# ── COMPACT BINARY FORMAT ─────────────────────────────────────────────────────
+# Text CSV files are slow to re-read. This alternative format stores the same
+# three columns as raw bytes, one column after another:
+#
+#   header   - 16 bytes: the letters "DICE", format version, and the row count
+#   results  - one byte (uint8) per roll
+#   guesses  - one byte (uint8) per roll
+#   correct  - one bit per roll, packed eight to a byte
+#
+# A billion rolls take about 2.1 GB instead of roughly 12 GB of text, and the
+# file can be memory-mapped: NumPy reads the columns straight from disk
+# without loading or copying the whole file.
+BINARY_MAGIC = b"DICE"
+BINARY_VERSION = 1
+BINARY_HEADER = np.dtype([("magic", "S4"), ("version", "<u2"), ("reserved", "<u2"), ("rows", "<u8")])
+
+# Number of 1 bits in every possible byte, used to count correct guesses
+BIT_COUNTS = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+# Creates an empty binary file for the given number of rows and returns
+# memory-mapped (results, guesses, correct_bits) columns to fill in.
+def create_dice_binary(path, rows):
+    header = np.zeros(1, dtype=BINARY_HEADER)
+    header["magic"] = BINARY_MAGIC
+    header["version"] = BINARY_VERSION
+    header["rows"] = rows
+
+    with open(path, "wb") as binary_file:
+        binary_file.write(header.tobytes())
+        binary_file.truncate(BINARY_HEADER.itemsize + 2 * rows + (rows + 7) // 8)
+
+    return map_dice_binary(path, mode="r+")
+
+
+# Opens a binary dice file and returns memory-mapped (results, guesses,
+# correct_bits) columns. Nothing is read from disk until it is used.
+def map_dice_binary(path, mode="r"):
+    header = np.fromfile(path, dtype=BINARY_HEADER, count=1)
+    if header.size != 1 or header["magic"][0] != BINARY_MAGIC:
+        raise ValueError(f"{path} is not a binary dice results file")
+    if header["version"][0] != BINARY_VERSION:
+        raise ValueError(f"{path} has unsupported format version {header['version'][0]}")
+
+    rows = int(header["rows"][0])
+    offset = BINARY_HEADER.itemsize
+    results = np.memmap(path, dtype=np.uint8, mode=mode, offset=offset, shape=(rows,))
+    guesses = np.memmap(path, dtype=np.uint8, mode=mode, offset=offset + rows, shape=(rows,))
+    correct_bits = np.memmap(path, dtype=np.uint8, mode=mode, offset=offset + 2 * rows,
+                             shape=((rows + 7) // 8,))
+    return results, guesses, correct_bits
+
+
+# Unpacks the correct-guess bits for rows start to stop (start must be a multiple of 8)
+def unpack_correct(correct_bits, start, stop):
+    bits = np.unpackbits(correct_bits[start // 8:(stop + 7) // 8], count=stop - start, bitorder="little")
+    return bits.astype(bool)
+
+
+# Writes chunks of (results, guesses, correct) arrays to a binary file.
+# Every chunk except the last must hold a multiple of 8 rows.
+#
+# Returns: the summary dictionary (rolls, hits and face_counts)
+def write_dice_binary(path, rows, chunks):
+    results_column, guesses_column, correct_bits = create_dice_binary(path, rows)
+    summary = new_summary()
+    start = 0
+
+    for results, guesses, correct in chunks:
+        stop = start + results.size
+        if start % 8:
+            raise ValueError("only the last chunk may hold a number of rows that is not a multiple of 8")
+        results_column[start:stop] = results
+        guesses_column[start:stop] = guesses
+        correct_bits[start // 8:(stop + 7) // 8] = np.packbits(correct, bitorder="little")
+        update_summary(summary, results, correct)
+        start = stop
+
+    if start != rows:
+        raise ValueError(f"expected {rows} rows but received {start}")
+
+    results_column.flush()
+    guesses_column.flush()
+    correct_bits.flush()
+    return summary
+
+
+# Rolls the dice straight into the binary format (see stream_rolls_to_csv)
+@traced("simulate", steps="total_rolls", output="path")
+def stream_rolls_to_binary(path, total_rolls, seed=None, user_guess=None, chunk_size=1_000_000):
+    chunk_size = max(8, chunk_size - chunk_size % 8)
+    return write_dice_binary(path, total_rolls,
+                             generate_roll_chunks(total_rolls, seed, user_guess, chunk_size))
+
+
+# ── MEMORY-MAPPED ANALYSIS ────────────────────────────────────────────────────
+# Works out the face frequencies, hit rate and chi-square test straight from
+# the memory-mapped columns, a chunk at a time, without copying the file.
+#
+# Returns: the summary dictionary plus "hit_rate", "chi_square" and "p_value"
+@traced("simulate")
+def summarise_dice_binary(path, chunk_size=8_000_000):
+    results, guesses, correct_bits = map_dice_binary(path)
+    summary = new_summary()
+    summary["rolls"] = int(results.size)
+
+    face_counts = np.zeros(7, dtype=np.int64)
+    for start in range(0, results.size, chunk_size):
+        face_counts += np.bincount(results[start:start + chunk_size], minlength=7)[:7]
+    summary["face_counts"] = [int(count) for count in face_counts[1:7]]
+
+    byte_chunk = max(1, chunk_size // 8)
+    summary["hits"] = sum(int(BIT_COUNTS[correct_bits[start:start + byte_chunk]].sum(dtype=np.int64))
+                          for start in range(0, correct_bits.size, byte_chunk))
+
+    summary["hit_rate"] = hit_rate(summary)
+    summary["chi_square"], summary["p_value"] = chi_square_test(summary["face_counts"])
+    return summary
+
+
+# ── CONVERTING BETWEEN CSV AND BINARY ─────────────────────────────────────────
+# A valid CSV row follows the same rules as check_guess in 9.1: the result and
+# guess are whole numbers from 1 to 6, and Guess Correct is True exactly when
+# they are equal. That leaves 36 of the 72 rows in ROW_TABLE, so a row can be
+# turned back into its three values with a simple dictionary lookup. Both the
+# converter and the sharded analysis below use this one table.
+ROW_VALUES = {
+    row.rstrip(b"\n"): index
+    for index, row in enumerate(ROW_TABLE)
+    if index % 2 == (index // 12 == index // 2 % 6)  # correct == (result == guess)
+}
+FACES = ("1", "2", "3", "4", "5", "6")
+
+
+# Explains why a row is not in ROW_VALUES
+def row_problem(fields):
+    if len(fields) != 3:
+        return f"expected 3 values, found {len(fields)}"
+
+    result, guess, correct = (field.strip() for field in fields)
+    for name, value in (("Dice Result", result), ("User Guess", guess)):
+        if not value.isdigit():
+            return f"{name} {value!r} is not a whole number"
+        if value not in FACES:
+            return f"{name} {value!r} is not one of 1 to 6"
+
+    if correct not in ("True", "False"):
+        return f"Guess Correct {correct!r} is not True or False"
+    if (correct == "True") != (result == guess):
+        return f"Guess Correct is {correct} but the result was {result} and the guess {guess}"
+    return None
+
+
+# Reads a dice results CSV a chunk of rows at a time.
+#
+# Yields: (results, guesses, correct) arrays of roughly chunk_size rows each
+def read_csv_chunks(path, chunk_size=1_000_000):
+    with open(path, "rb") as csv_file:
+        header = csv_file.readline()
+        if header.strip() != CSV_HEADER.strip().encode():
+            raise ValueError(f"{path} does not start with the header {CSV_HEADER.strip()!r}")
+
+        while True:
+            lines = csv_file.readlines(chunk_size * 10)
+            if not lines:
+                break
+            try:
+                indexes = np.array([ROW_VALUES[line.strip().replace(b" ", b"")] for line in lines if line.strip()],
+                                   dtype=np.intp)
+            except KeyError as error:
+                row = error.args[0].decode(errors="replace")
+                raise ValueError(f"{path} contains an invalid row {row!r}: "
+                                 f"{row_problem(row.split(','))}") from None
+
+            correct = (indexes % 2).astype(bool)
+            guesses = (indexes // 2 % 6 + 1).astype(np.uint8)
+            results = (indexes // 12 + 1).astype(np.uint8)
+            yield results, guesses, correct
+
+
+# Counts the data rows in a CSV file (every line after the header that isn't blank)
+def count_csv_rows(path):
+    rows = 0
+    with open(path, "rb") as csv_file:
+        csv_file.readline()
+        for line in csv_file:
+            if line.strip():
+                rows += 1
+    return rows
+
+
+# Joins or splits chunks so every chunk but the last holds a multiple of 8 rows,
+# which keeps each chunk's correct bits in whole bytes.
+def rechunk(chunks):
+    leftover = None
+    for chunk in chunks:
+        if leftover is not None:
+            chunk = tuple(np.concatenate(pair) for pair in zip(leftover, chunk))
+        keep = chunk[0].size - chunk[0].size % 8
+        leftover = tuple(column[keep:] for column in chunk)
+        if keep:
+            yield tuple(column[:keep] for column in chunk)
+    if leftover is not None and leftover[0].size:
+        yield leftover
+
+
+# Converts a dice results CSV into the binary format.
+# The CSV is read twice: once to count the rows, once to copy them.
+@traced("simulate", output="binary_path")
+def csv_to_binary(csv_path, binary_path, chunk_size=1_000_000):
+    rows = count_csv_rows(csv_path)
+    return write_dice_binary(binary_path, rows, rechunk(read_csv_chunks(csv_path, chunk_size)))
+
+
+# Converts a binary dice file back into the three-column CSV
+@traced("simulate", output="csv_path")
+def binary_to_csv(binary_path, csv_path, chunk_size=1_000_000):
+    results, guesses, correct_bits = map_dice_binary(binary_path)
+    chunk_size = max(8, chunk_size - chunk_size % 8)
+
+    with open(csv_path, "wb") as csv_file:
+        csv_file.write(CSV_HEADER.encode())
+        for start in range(0, results.size, chunk_size):
+            stop = min(start + chunk_size, results.size)
+            correct = unpack_correct(correct_bits, start, stop)
+            rows = ROW_TABLE[row_index(results[start:stop], guesses[start:stop], correct)]
+            csv_file.write(b"".join(rows))
+
+
+# ── SHARDED FAIRNESS ANALYSIS ─────────────────────────────────────────────────
+# Large experiments are saved as many CSV files ("shards"). Each shard is
+# analysed on its own CPU core, producing a small dictionary of whole-number
+# totals. Because they are just counts and sums, the totals from every shard
+# can be added together exactly, in any order, to give the overall result.
+#
+# Bad rows don't stop the analysis. They are checked against ROW_VALUES (the
+# same rules as the converter above), counted, and reported with row_problem.
+MAX_REPORTED_ERRORS = 20  # per shard, so a badly broken file can't flood the report
+
+
+# Totals for an empty shard
+def new_shard_stats():
+    return {
+        "rows": 0,
+        "invalid_rows": 0,
+        "pair_counts": [0] * 36,  # how often each (result, guess) pair appeared
+        "errors": [],             # (file, line number, problem) for the first few bad rows
+    }
+
+
+# Analyses one CSV shard. This is what each worker process runs.
+#
+# Returns: a shard stats dictionary
+def analyse_shard(path):
+    stats = new_shard_stats()
+
+    def report(line_number, problem):
+        stats["invalid_rows"] += 1
+        if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+            stats["errors"].append((str(path), line_number, problem))
+
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace", newline="") as csv_file:
+            header = csv_file.readline()
+            if header.strip() != CSV_HEADER.strip():
+                report(1, f"unexpected header {header.strip()!r}, shard skipped")
+                return stats
+
+            # Counted as the rows are read, so memory use doesn't grow with the shard
+            pair_counts = stats["pair_counts"]
+            for line_number, line in enumerate(csv_file, start=2):
+                row = line.strip()
+                if not row:
+                    continue
+                index = ROW_VALUES.get(row.replace(" ", "").encode())
+                if index is None:
+                    report(line_number, row_problem(row.split(",")))
+                else:
+                    pair_counts[index // 2] += 1
+    except OSError as error:
+        report(0, f"could not read shard: {error}")
+        return stats
+
+    stats["rows"] = sum(stats["pair_counts"])
+    return stats
+
+
+# Adds two sets of shard totals together
+def merge_shard_stats(first, second):
+    return {
+        "rows": first["rows"] + second["rows"],
+        "invalid_rows": first["invalid_rows"] + second["invalid_rows"],
+        "pair_counts": [a + b for a, b in zip(first["pair_counts"], second["pair_counts"])],
+        "errors": first["errors"] + second["errors"],
+    }
+
+
+# Wilson score interval: a confidence interval for a proportion (here, the hit
+# rate) that stays sensible even when the number of rolls is small.
+def wilson_interval(hits, rolls, z=1.96):
+    if rolls == 0:
+        return 0.0, 1.0
+    proportion = hits / rolls
+    denominator = 1 + z**2 / rolls
+    centre = (proportion + z**2 / (2 * rolls)) / denominator
+    margin = z * math.sqrt(proportion * (1 - proportion) / rolls + z**2 / (4 * rolls**2)) / denominator
+    return max(centre - margin, 0.0), min(centre + margin, 1.0)
+
+
+# Turns merged shard totals into the final fairness report
+def fairness_report(stats):
+    pairs = np.array(stats["pair_counts"], dtype=np.int64).reshape(6, 6)  # rows = result, columns = guess
+    face_counts = [int(count) for count in pairs.sum(axis=1)]
+    hits = int(np.trace(pairs))
+    rolls = stats["rows"]
+
+    # Mean and variance of the dice results, worked out exactly from whole-number sums
+    faces = np.arange(1, 7)
+    total = int(np.dot(face_counts, faces))
+    total_squares = int(np.dot(face_counts, faces**2))
+    mean = total / rolls if rolls else 0.0
+    variance = (total_squares - total * total / rolls) / (rolls - 1) if rolls > 1 else 0.0
+
+    chi_square, p_value = chi_square_test(face_counts)
+    low, high = wilson_interval(hits, rolls)
+
+    return {
+        "rolls": rolls,
+        "invalid_rows": stats["invalid_rows"],
+        "face_counts": face_counts,
+        "hits": hits,
+        "hit_rate": hits / rolls if rolls else 0.0,
+        "hit_rate_95_ci": (low, high),
+        "mean": mean,              # a fair dice averages 3.5
+        "variance": variance,      # a fair dice has variance 35/12 ≈ 2.917
+        "chi_square": chi_square,
+        "p_value": p_value,
+        "errors": stats["errors"],
+    }
+
+
+# Analyses many CSV shards in parallel and merges them into one report.
+#
+# Parameters:
+#   paths   - the CSV shard files
+#   workers - number of processes to use (None = one per CPU core)
+#
+# Returns: the fairness report dictionary
+@traced("simulate")
+def analyse_shards(paths, workers=None):
+    merged = new_shard_stats()
+    for stats in map_jobs(analyse_shard, [(path,) for path in paths], workers):
+        merged = merge_shard_stats(merged, stats)
+    return fairness_report(merged)
+
+
+# ── RUN THE EXPERIMENT ────────────────────────────────────────────────────────
+# Roll the dice 600 times with a hardcoded guess. In theory the guess should be
+# correct one roll in six — about 100 times.
+# (Only runs when this file is run directly, not when it is imported.)
+total_rolls = 600
+user_guess = 3
+
+if __name__ == "__main__":
+    summary = stream_rolls_to_csv("dice_results.csv", total_rolls, user_guess=user_guess)
+
+    print(f"Rolls: {summary['rolls']}")
+    for face, count in enumerate(summary["face_counts"], start=1):
+        print(f"  Face {face}: {count} ({count / summary['rolls']:.1%})")
+    print(f"Correct guesses: {summary['hits']} (expected about {summary['rolls'] // 6})")
+    print(f"Hit rate: {hit_rate(summary):.3f}")
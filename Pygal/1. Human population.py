@@ -3,7 +3,16 @@
 # Date: 24/2/26
 # -----------------------------------
 
-import pygal
+import sys
+
+import numpy as np
+
+import downsampling
+from checkpoints import open_checkpoint, read_series, save_progress, scenario_checkpoint_path
+from downsampling import DEFAULT_MAX_POINTS, add_series
+from instrumentation import span, traced
+from model_cache import (cache_key, cache_summary, cached_series, open_cache, pygal_version,
+                         restore_svg, store_svg)
 
 # ── HUMAN POPULATION MODEL ────────────────────────────────────────────────────
 # This function simulates exponential population growth over a number of years.
@@ -17,6 +26,7 @@ import pygal
 #   years       - how many years to simulate
 #
 # Returns: a list of population values, one per year
+@traced("simulate", steps="years")
 def run_population_model(population, growth_rate, years):
     history = []
     for year in range(years):
@@ -27,9 +37,135 @@ def run_population_model(population, growth_rate, years):
     return history
 
 
+# ── STREAMING MODE ────────────────────────────────────────────────────────────
+# A generator version of run_population_model. Instead of building the whole
+# history list, it hands back one year at a time, only when asked for it.
+# This means very long simulations never need to hold every year in memory.
+#
+# Parameters:
+#   population  - the starting population
+#   growth_rate - the annual growth rate as a decimal
+#   years       - how many years to simulate (None = keep going forever)
+#
+# Yields: the rounded population for each year, exactly as run_population_model
+def iter_population_model(population, growth_rate, years=None):
+    year = 0
+    while years is None or year < years:
+        population = population * (1 + growth_rate)
+        yield round(population)
+        year += 1
+
+
+# ── CHECKPOINTED RUNS ─────────────────────────────────────────────────────────
+# Like run_population_model, but saves its progress in a checkpoint (see
+# checkpoints.py). Running it again with more years only calculates the new
+# years; running it with fewer just reads the saved years back. The results
+# are exactly the same as run_population_model's.
+#
+# Parameters:
+#   checkpoint_path  - where to keep the checkpoint
+#   population       - the starting population
+#   growth_rate      - the annual growth rate as a decimal
+#   years            - how many years the history should cover
+#   checkpoint_every - how many years to calculate between saves, so an
+#                      interrupted run loses at most this many years
+#
+# Returns: a list of population values, one per year
+@traced("simulate", steps="years")
+def extend_population_model(checkpoint_path, population, growth_rate, years,
+                            checkpoint_every=100_000):
+    checkpoint = open_checkpoint(checkpoint_path, "human_population",
+                                 {"population": population, "growth_rate": growth_rate})
+    if checkpoint["state"] is not None:
+        population = checkpoint["state"]["population"]  # the unrounded value, to carry on exactly
+
+    while checkpoint["step"] < years:
+        start = checkpoint["step"]
+        new_values = []
+        for year in range(start, min(years, start + checkpoint_every)):
+            population = population * (1 + growth_rate)
+            new_values.append(round(population))
+        save_progress(checkpoint, new_values, start + len(new_values), {"population": population})
+
+    return [int(value) for value in read_series(checkpoint)[:years]]
+
+
+# Runs every scenario with its own checkpoint in directory. If a long run is
+# interrupted, running it again skips the scenarios that already finished.
+#
+# Returns: a list of population histories, one per scenario
+def run_population_scenarios(directory, scenarios, years, checkpoint_every=100_000):
+    histories = []
+    for scenario in scenarios:
+        params = {"population": scenario["initial_population"], "growth_rate": scenario["growth_rate"]}
+        histories.append(extend_population_model(
+            scenario_checkpoint_path(directory, "human_population", params),
+            scenario["initial_population"], scenario["growth_rate"], years, checkpoint_every
+        ))
+    return histories
+
+
+# ── BATCH MODE ────────────────────────────────────────────────────────────────
+# Runs many (population, growth_rate) pairs at once using NumPy arrays — one
+# row per scenario, one column per year. There are two ways to do it:
+#
+#   "compound"    - repeats the loop's multiplication year by year, but for every
+#                   scenario at once. The results match run_population_model
+#                   bit for bit.
+#   "closed_form" - compound growth has a formula, so we can skip the loop:
+#                       population after t years = P0 × (1 + r)^t
+#                   Any year can be calculated directly without the ones before
+#                   it. The formula can differ from the loop in the last few
+#                   significant digits, so a rounded value is occasionally off
+#                   by one (more for astronomically large populations).
+#
+# Rounding follows Python's round(): halves go to the nearest even number.
+# The results are stored as floats so that huge populations don't overflow;
+# int() of any value gives the same whole number round() would.
+#
+# Parameters:
+#   populations  - the starting population of each scenario
+#   growth_rates - the annual growth rate of each scenario
+#   years        - how many years to simulate
+#   year_points  - optional list of years (1 to years) to report, e.g. [10, 100, 1000].
+#                  Only these columns are stored, which keeps memory small.
+#   method       - "compound" (repeated multiplication) or "closed_form" (P0 × (1 + r)^t)
+#
+# Returns: a (scenarios × years) array, or (scenarios × len(year_points)) if given
+@traced("simulate", steps="years")
+def run_population_batch(populations, growth_rates, years, year_points=None,
+                         method="compound"):
+    populations = np.asarray(populations, dtype=float).reshape(-1, 1)
+    growth_rates = np.asarray(growth_rates, dtype=float).reshape(-1, 1)
+
+    if year_points is None:
+        year_points = np.arange(1, years + 1)
+    year_points = np.asarray(year_points, dtype=int)
+    if year_points.size and (year_points.min() < 1 or year_points.max() > years):
+        raise ValueError(f"year_points must be between 1 and {years}")
+
+    if method == "compound":
+        # Same multiplication order as run_population_model, one year at a time
+        values = np.empty((np.broadcast(populations, growth_rates).shape[0], year_points.size))
+        current = populations[:, 0] * np.ones_like(growth_rates[:, 0])
+        wanted = {year: column for column, year in enumerate(year_points)}
+        for year in range(1, year_points.max(initial=0) + 1):
+            current = current * (1 + growth_rates[:, 0])
+            if year in wanted:
+                values[:, wanted[year]] = current
+    elif method == "closed_form":
+        values = populations * (1 + growth_rates) ** year_points
+    else:
+        raise ValueError(f"unknown method {method!r} (expected 'compound' or 'closed_form')")
+
+    # np.rint rounds halves to even, the same rule as Python's round()
+    return np.rint(values)
+
+
 # ── SIMULATION PARAMETERS ─────────────────────────────────────────────────────
 starting_population = 1000  # initial population at year 0
 years = 20                  # how many years to simulate
+max_chart_points = DEFAULT_MAX_POINTS  # longer runs are downsampled before drawing
 
 
 # ── WHAT-IF SCENARIOS ─────────────────────────────────────────────────────────
@@ -50,40 +186,75 @@ scenarios = [
 year_labels = [f"Year {y + 1}" for y in range(years)]
 
 
-# ── CREATE THE CHART ──────────────────────────────────────────────────────────
+# ── CHART SETTINGS ────────────────────────────────────────────────────────────
 # pygal.Line() creates an interactive line chart.
 # disable_xml_declaration makes the SVG easier to embed directly into a web page.
-lineChart = pygal.Line(
+chart_config = dict(
     x_title='Year',
     y_title='Population',
     title='Human Population Growth: What-if Scenarios',
     x_label_rotation=45,    # rotate x-axis labels so they don't overlap
     show_minor_x_labels=False
 )
+chart_file = 'human_population_growth.svg'
+
+
+# ── MAIN PROGRAM ──────────────────────────────────────────────────────────────
+# Everything above can be imported and reused (e.g. run_population_model)
+# without drawing anything. The chart is only built when this file is run.
+def main():
+    # ── CACHE ─────────────────────────────────────────────────────────────────────
+    # Results and charts are saved in a cache (see model_cache.py). If nothing that
+    # affects the chart has changed since the last run, the saved chart is reused
+    # and no simulation or rendering happens at all.
+    cache = open_cache()
+    chart_key = cache_key([run_population_model, sys.modules[__name__], downsampling],
+                          scenarios, years, year_labels, chart_config, max_chart_points,
+                          pygal_version())
+
+    if not restore_svg(cache, chart_key, chart_file):
 
-# Attach the year labels to the x-axis so each point is clearly labelled
-lineChart.x_labels = year_labels
+        # ── CREATE THE CHART ──────────────────────────────────────────────────────
+        # pygal is only loaded when a chart actually needs drawing
+        import pygal
+        lineChart = pygal.Line(**chart_config)
 
+        # ── RUN SIMULATIONS AND POPULATE THE CHART ────────────────────────────────
+        # Run the model for each scenario and collect the results as lines for the chart.
+        chart_series = []
+        for scenario in scenarios:
 
-# ── RUN SIMULATIONS AND POPULATE THE CHART ────────────────────────────────────
-# Run the model for each scenario and add the results as a line on the chart.
-for scenario in scenarios:
+            # Run the population model for this scenario's starting conditions
+            # (or reuse the saved result if this exact scenario has been run before)
+            population_history = cached_series(
+                cache, run_population_model,
+                [scenario["initial_population"], scenario["growth_rate"], years],
+                lambda: run_population_model(
+                    scenario["initial_population"],
+                    scenario["growth_rate"],
+                    years
+                )
+            )
 
-    # Run the population model for this scenario's starting conditions
-    population_history = run_population_model(
-        scenario["initial_population"],
-        scenario["growth_rate"],
-        years
-    )
+            # Keep this scenario's results for the chart.
+            # The label will appear in the interactive legend.
+            chart_series.append((scenario["label"], population_history))
 
-    # Add this scenario's results to the chart.
-    # The label will appear in the interactive legend.
-    lineChart.add(scenario["label"], population_history)
+        # Add every line to the chart, with the year labels attached to the x-axis so
+        # each point is clearly labelled. Very long runs are reduced to at most
+        # max_chart_points points first, keeping peaks and turning points visible.
+        with span("build line chart", "build", lines=len(chart_series)):
+            add_series(lineChart, chart_series, x_labels=year_labels, max_points=max_chart_points)
 
+        # ── RENDER THE CHART ──────────────────────────────────────────────────────
+        # Save the chart as an interactive SVG file.
+        # Open it in a web browser to explore the data — hover over points to see values.
+        with span("render line chart", "render", output=chart_file):
+            lineChart.render_to_file(chart_file)
+        store_svg(cache, chart_key, chart_file)
 
-# ── RENDER THE CHART ──────────────────────────────────────────────────────────
-# Save the chart as an interactive SVG file.
-# Open it in a web browser to explore the data — hover over points to see values.
-lineChart.render_to_file('human_population_growth.svg')
+    print(cache_summary(cache))
 
 
+if __name__ == "__main__":
+    main()
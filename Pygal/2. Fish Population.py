@@ -4,7 +4,16 @@
 # ----------------------------------------
 
 
-import pygal
+import sys
+
+import numpy as np
+
+import downsampling
+from checkpoints import open_checkpoint, read_series, save_progress, scenario_checkpoint_path
+from downsampling import DEFAULT_MAX_POINTS, add_series
+from instrumentation import span, traced
+from model_cache import (cache_key, cache_summary, cached_series, open_cache, pygal_version,
+                         restore_svg, store_svg)
 
 # ── FISH POPULATION MODEL ──────────────────────────────────────────────────────
 # This function calculates how much the fish population changes in one time step.
@@ -23,16 +32,319 @@ def fishModel(population, growthRate, carryingCapacity, harvestRate):
     return growthRate * population * (1 - population / carryingCapacity) - harvestRate
 
 
+# ── ONE SCENARIO WITH EULER'S METHOD ──────────────────────────────────────────
+# Simulates the fish population over time for one set of starting conditions.
+#
+# Parameters:
+#   initialPopulation - number of fish at the start
+#   harvestRate       - how many fish are removed per unit of time
+#   growthRate        - how fast the fish reproduce
+#   carryingCapacity  - the maximum population the environment can support
+#   timeStep          - how much time passes between each calculation
+#   numSteps          - total number of calculation steps
+#
+# Returns: a list of population values, one per time point
+@traced("simulate", steps="numSteps")
+def runFishScenario(initialPopulation, harvestRate, growthRate, carryingCapacity,
+                    timeStep, numSteps):
+
+    # Start the population history list with just the initial population value
+    popHistory = [initialPopulation]
+
+    # Simulate each time step using Euler's method:
+    # next value = current value + (rate of change × time step size)
+    # This is a simple but effective way to approximate how a system evolves over time.
+    for step in range(1, numSteps + 1):
+        currentPop = popHistory[-1]  # grab the most recently calculated population
+
+        nextPop = currentPop + timeStep * fishModel(
+            currentPop,
+            growthRate=growthRate,
+            carryingCapacity=carryingCapacity,
+            harvestRate=harvestRate
+        )
+
+        # Prevent the population going negative — in reality, fish can't number below zero.
+        # If the model calculates a negative value, we cap it at zero (extinction).
+        popHistory.append(max(nextPop, 0))
+
+    return popHistory
+
+
+# ── CHECKPOINTED RUNS ─────────────────────────────────────────────────────────
+# Like runFishScenario, but saves its progress in a checkpoint (see
+# checkpoints.py). Running it again with more steps (a longer totalTime) only
+# calculates the new steps; running it with fewer just reads the saved values
+# back. The values are exactly the same as runFishScenario's (stored as floats).
+#
+# Parameters:
+#   checkpointPath  - where to keep the checkpoint
+#   numSteps        - how many steps the history should cover
+#   checkpointEvery - how many steps to calculate between saves, so an
+#                     interrupted run loses at most this many steps
+#   (the rest are the same as runFishScenario)
+#
+# Returns: a list of population values, one per time point
+@traced("simulate", steps="numSteps")
+def extendFishScenario(checkpointPath, initialPopulation, harvestRate, growthRate,
+                       carryingCapacity, timeStep, numSteps, checkpointEvery=100_000):
+    checkpoint = open_checkpoint(checkpointPath, "fish_population", {
+        "initialPopulation": initialPopulation, "harvestRate": harvestRate,
+        "growthRate": growthRate, "carryingCapacity": carryingCapacity, "timeStep": timeStep,
+    })
+
+    if checkpoint["state"] is None:
+        # A new checkpoint starts with just the initial population (step 0)
+        save_progress(checkpoint, [initialPopulation], 0, {"population": initialPopulation})
+    currentPop = checkpoint["state"]["population"]
+
+    while checkpoint["step"] < numSteps:
+        start = checkpoint["step"]
+        newValues = []
+        for step in range(start + 1, min(numSteps, start + checkpointEvery) + 1):
+            nextPop = currentPop + timeStep * fishModel(
+                currentPop,
+                growthRate=growthRate,
+                carryingCapacity=carryingCapacity,
+                harvestRate=harvestRate
+            )
+            currentPop = max(nextPop, 0)
+            newValues.append(currentPop)
+        save_progress(checkpoint, newValues, start + len(newValues), {"population": currentPop})
+
+    return read_series(checkpoint)[:numSteps + 1].tolist()
+
+
+# Runs every scenario with its own checkpoint in directory. If a long run is
+# interrupted, running it again skips the scenarios that already finished.
+#
+# Returns: a list of population histories, one per scenario
+def runFishScenarios(directory, scenarios, growthRate, carryingCapacity, timeStep, numSteps,
+                     checkpointEvery=100_000):
+    histories = []
+    for scenario in scenarios:
+        params = [scenario["initial_population"], scenario["harvestRate"],
+                  growthRate, carryingCapacity, timeStep]
+        histories.append(extendFishScenario(
+            scenario_checkpoint_path(directory, "fish_population", params),
+            scenario["initial_population"], scenario["harvestRate"], growthRate,
+            carryingCapacity, timeStep, numSteps, checkpointEvery
+        ))
+    return histories
+
+
+# ── BATCH EULER ENGINE ────────────────────────────────────────────────────────
+# Runs many scenarios at once. Instead of looping over each scenario and then
+# over each step, every scenario is stored as one row of a NumPy array and all
+# rows are stepped forward together. fishModel works unchanged on arrays, so
+# each step is still: next value = current value + (rate of change × time step).
+#
+# Parameters:
+#   initialPopulations - starting population for each scenario (one per row)
+#   harvestRates       - harvest rate for each scenario (or one value for all)
+#   growthRate         - how fast the fish reproduce (shared by every scenario)
+#   carryingCapacity   - the maximum population the environment can support
+#   timeStep           - how much time passes between each calculation
+#   numSteps           - total number of calculation steps
+#   out                - optional preallocated (scenarios × numSteps+1) array to
+#                        write into, so repeated runs don't allocate new memory
+#
+# Returns: a (scenarios × numSteps+1) array — row i is the popHistory of scenario i
+@traced("simulate", steps="numSteps")
+def runFishBatch(initialPopulations, harvestRates, growthRate, carryingCapacity,
+                 timeStep, numSteps, out=None):
+    initialPopulations = np.ravel(np.asarray(initialPopulations, dtype=float))
+    harvestRates = np.broadcast_to(np.asarray(harvestRates, dtype=float),
+                                   initialPopulations.shape)
+
+    shape = (initialPopulations.size, numSteps + 1)
+    if out is None:
+        out = np.empty(shape)
+    elif out.shape != shape:
+        raise ValueError(f"out must have shape {shape}, got {out.shape}")
+
+    # Column 0 holds the starting populations, exactly like popHistory[0]
+    out[:, 0] = initialPopulations
+
+    for step in range(1, numSteps + 1):
+        currentPop = out[:, step - 1]
+        nextPop = currentPop + timeStep * fishModel(
+            currentPop, growthRate, carryingCapacity, harvestRates
+        )
+        # Same extinction clamp as the single-scenario loop: max(nextPop, 0)
+        np.maximum(nextPop, 0, out=out[:, step])
+
+    return out
+
+
+# ── ADAPTIVE-STEP INTEGRATOR ──────────────────────────────────────────────────
+# Euler's method needs a tiny timeStep to stay accurate over long simulations.
+# This integrator uses the Dormand–Prince Runge–Kutta method instead: each step
+# computes two estimates of the next value (5th and 4th order) and uses the
+# difference between them to measure the error. If the error is too big the
+# step is retried with a smaller size; if it is tiny the next step grows.
+# Smooth stretches of the curve are therefore crossed in a few large steps.
+#
+# Instead of clamping with max(nextPop, 0) after every step, the integrator
+# watches for the population crossing zero. When it does, the exact moment of
+# extinction is located inside that step and integration stops — the rest of
+# the trajectory is zero, just like the clamped Euler loop.
+#
+# The accepted steps are then resampled onto the requested time points so the
+# result can be passed straight to lineChart.add() with the same x-axis. The
+# values in between come from the method's own "dense output" formula, which
+# reuses the seven stage slopes and is as accurate as the steps themselves.
+
+# Dormand–Prince coefficients (the "Butcher tableau" for this method)
+DP_C = [0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1]
+DP_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+    [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+]
+DP_B5 = [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0]
+DP_B4 = [5179 / 57600, 0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40]
+
+# Dense output coefficients: the weight of stage i at a fraction s of the way
+# through a step is DP_DENSE[i][0]·s + DP_DENSE[i][1]·s² + ... (a 4th-order
+# polynomial that matches DP_B5 at s = 1)
+DP_DENSE = np.array([
+    [1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+    [0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+    [0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+    [0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+    [0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423],
+])
+
+
+# Estimates the values at times t (a NumPy array) inside an accepted step from
+# t0 to t0 + h, using the seven stage slopes k of that step (Dormand–Prince
+# dense output). Every time point in the step is worked out at once.
+def denseOutput(t, t0, y0, h, k):
+    s = (np.asarray(t, dtype=float) - t0) / h
+    powers = s[..., np.newaxis] ** np.arange(1, 5)  # s, s², s³, s⁴ for each time
+    return y0 + h * (powers @ (np.asarray(k) @ DP_DENSE))
+
+
+# Parameters:
+#   rateFunction - function of the current value that returns its rate of change
+#   initialValue - value at time_points[0]
+#   time_points  - increasing list of times the result should be reported at
+#   rtol, atol   - relative and absolute error allowed on each step
+#
+# Returns: a list of values, one per time point (zero after extinction)
+def integrateAdaptive(rateFunction, initialValue, time_points, rtol=1e-6, atol=1e-9):
+    time_points = np.asarray(time_points, dtype=float)
+    tEnd = time_points[-1]
+    t = time_points[0]
+    y = initialValue
+    f = rateFunction(y)
+
+    history = np.zeros(time_points.size)  # anything not filled in stays zero (extinct)
+    history[0] = max(y, 0)
+    nextIndex = 1
+    h = (tEnd - t) / 100 or 1.0
+
+    while t < tEnd:
+        h = min(h, tEnd - t)
+
+        # Evaluate the seven stages of the Dormand–Prince step
+        k = [f]
+        for stage in range(1, 7):
+            yStage = y + h * sum(a * kj for a, kj in zip(DP_A[stage], k))
+            k.append(rateFunction(yStage))
+
+        yNew = y + h * sum(b * kj for b, kj in zip(DP_B5, k))
+        yLow = y + h * sum(b * kj for b, kj in zip(DP_B4, k))
+
+        # Compare the two estimates to decide whether the step was accurate enough
+        scale = atol + rtol * max(abs(y), abs(yNew))
+        error = abs(yNew - yLow) / scale
+
+        if error > 1:
+            h *= max(0.2, 0.9 * error ** -0.2)
+            continue
+
+        tNew = tEnd if h == tEnd - t else t + h
+
+        if yNew <= 0:
+            # The population crossed zero during this step: bisect to find when
+            lo, hi = t, tNew
+            for _ in range(60):
+                mid = (lo + hi) / 2
+                if denseOutput(mid, t, y, h, k) > 0:
+                    lo = mid
+                else:
+                    hi = mid
+            extinctionTime = hi
+
+            # Everything from the moment of extinction onwards stays zero
+            stop = np.searchsorted(time_points, extinctionTime, side="left")
+            if stop > nextIndex:
+                history[nextIndex:stop] = np.maximum(
+                    denseOutput(time_points[nextIndex:stop], t, y, h, k), 0)
+            break
+
+        # Record every requested time point inside this step in one go
+        stop = np.searchsorted(time_points, tNew, side="right")
+        if stop > nextIndex:
+            history[nextIndex:stop] = np.maximum(denseOutput(time_points[nextIndex:stop], t, y, h, k), 0)
+            if time_points[stop - 1] == tNew:
+                history[stop - 1] = yNew
+            nextIndex = stop
+
+        t, y, f = tNew, yNew, k[6]  # the last stage is the slope at the end of the step
+        h *= min(5.0, 0.9 * error ** -0.2) if error > 0 else 5.0
+
+    return history.tolist()
+
+
+# The logistic growth and harvest equation solved with the adaptive integrator.
+# Takes the same parameters as fishModel plus the starting population and the
+# time points to report at.
+#
+# Returns: a list of population values, one per time point
+@traced("simulate")
+def runFishAdaptive(initialPopulation, growthRate, carryingCapacity, harvestRate,
+                    time_points, rtol=1e-6, atol=1e-9):
+    return integrateAdaptive(
+        lambda population: fishModel(population, growthRate, carryingCapacity, harvestRate),
+        initialPopulation,
+        time_points,
+        rtol=rtol,
+        atol=atol
+    )
+
+
+# ── TIPPING POINT FINDER ──────────────────────────────────────────────────────
+# tipping_points.py finds the smallest harvest rate that makes the population
+# collapse, for thousands of starting populations at once, e.g.
+#   findTippingPoints(fishModel, growthRate, carryingCapacity, np.linspace(1, 100, 5000), totalTime)
+
+
 # ── SIMULATION PARAMETERS ─────────────────────────────────────────────────────
 timeStep = 0.1   # how much time passes between each calculation (smaller = more accurate)
 totalTime = 20   # how long the simulation runs (e.g. 20 years)
 numSteps = int(totalTime / timeStep)  # total number of calculation steps needed
+growthRate = 0.5        # fish reproduce at 50% of their capacity per time unit
+carryingCapacity = 100  # the environment supports a maximum of 100 fish
+maxChartPoints = DEFAULT_MAX_POINTS   # longer runs are downsampled before drawing
+
+# Which method draws the chart: "euler" (runFishScenario, the method explained
+# above) or "adaptive" (runFishAdaptive, the Dormand–Prince integrator)
+integrator = "euler"
 
 
 # ── WHAT-IF SCENARIOS ─────────────────────────────────────────────────────────
 # Each scenario is a dictionary containing the starting conditions for one simulation run.
 # By changing the initial population and harvest rate, we can compare different outcomes.
-# All three scenarios use the same growth rate and carrying capacity (defined in the loop below).
+# All three scenarios use the same growth rate and carrying capacity (defined above).
 scenarios = [
     {"initial_population": 50, "harvestRate": 5,  "label": "Moderate Harvest"},
     {"initial_population": 50, "harvestRate": 10, "label": "Large Harvest"},
@@ -46,49 +358,98 @@ scenarios = [
 time_points = [step * timeStep for step in range(numSteps + 1)]
 
 
-# ── CREATE THE CHART ──────────────────────────────────────────────────────────
+# ── CHART SETTINGS ────────────────────────────────────────────────────────────
 # pygal.Line() creates an interactive line chart object.
 # We pass in axis labels and a title to make the chart easy to read.
-lineChart = pygal.Line(
+chartConfig = dict(
     x_title='Time',
     y_title='Fish Population',
-    title='Fish Population: What-if Scenarios'
+    title='Fish Population: What-if Scenarios',
+    show_minor_x_labels=False,
+    x_labels_major_count=11  # label every 2 years rather than every time step
 )
+chartFile = 'fish_population_what_if.svg'
 
 
-# ── RUN SIMULATIONS AND POPULATE THE CHART ────────────────────────────────────
-# Loop through each scenario and simulate the fish population over time.
-for scenario in scenarios:
+# ── MAIN PROGRAM ──────────────────────────────────────────────────────────────
+# Everything above can be imported and reused (e.g. fishModel, runFishBatch)
+# without drawing anything. The chart is only built when this file is run.
+def main():
+    # ── CACHE ─────────────────────────────────────────────────────────────────────
+    # Results and charts are saved in a cache (see model_cache.py). If nothing that
+    # affects the chart has changed since the last run, the saved chart is reused
+    # and no simulation or rendering happens at all.
+    cache = open_cache()
+    if integrator not in ("euler", "adaptive"):
+        raise ValueError(f"integrator must be 'euler' or 'adaptive', not {integrator!r}")
 
-    # Start the population history list with just the initial population value
-    popHistory = [scenario["initial_population"]]
+    chartKey = cache_key([runFishScenario, fishModel, sys.modules[__name__], downsampling],
+                         scenarios, growthRate, carryingCapacity, timeStep, numSteps, integrator,
+                         chartConfig, maxChartPoints, pygal_version())
 
-    # Simulate each time step using Euler's method:
-    # next value = current value + (rate of change × time step size)
-    # This is a simple but effective way to approximate how a system evolves over time.
-    for step in range(1, numSteps + 1):
-        currentPop = popHistory[-1]  # grab the most recently calculated population
+    if not restore_svg(cache, chartKey, chartFile):
 
-        nextPop = currentPop + timeStep * fishModel(
-            currentPop,
-            growthRate=0.5,          # fish reproduce at 50% of their capacity per time unit
-            carryingCapacity=100,    # the environment supports a maximum of 100 fish
-            harvestRate=scenario["harvestRate"]
-        )
+        # ── CREATE THE CHART ──────────────────────────────────────────────────────
+        # pygal is only loaded when a chart actually needs drawing
+        import pygal
+        lineChart = pygal.Line(**chartConfig)
 
-        # Prevent the population going negative — in reality, fish can't number below zero.
-        # If the model calculates a negative value, we cap it at zero (extinction).
-        popHistory.append(max(nextPop, 0))
+        # ── RUN SIMULATIONS AND POPULATE THE CHART ────────────────────────────────
+        # Loop through each scenario and simulate the fish population over time
+        # (or reuse the saved result if this exact scenario has been run before).
+        chartSeries = []
+        for scenario in scenarios:
+            if integrator == "adaptive":
+                popHistory = cached_series(
+                    cache, [runFishAdaptive, integrateAdaptive, denseOutput, fishModel],
+                    [scenario["initial_population"], scenario["harvestRate"],
+                     growthRate, carryingCapacity, time_points],
+                    lambda: runFishAdaptive(
+                        scenario["initial_population"],
+                        growthRate,
+                        carryingCapacity,
+                        scenario["harvestRate"],
+                        time_points
+                    )
+                )
+            else:
+                popHistory = cached_series(
+                    cache, [runFishScenario, fishModel],
+                    [scenario["initial_population"], scenario["harvestRate"],
+                     growthRate, carryingCapacity, timeStep, numSteps],
+                    lambda: runFishScenario(
+                        scenario["initial_population"],
+                        scenario["harvestRate"],
+                        growthRate=growthRate,
+                        carryingCapacity=carryingCapacity,
+                        timeStep=timeStep,
+                        numSteps=numSteps
+                    )
+                )
+
+            # Keep this scenario's population history as a line for the chart.
+            # The label (e.g. "Moderate Harvest") will appear in the chart legend.
+            chartSeries.append((scenario["label"], popHistory))
+
+        # Add every line to the chart, labelling the x-axis with the time points.
+        # If there are more than maxChartPoints steps, the lines are downsampled first,
+        # always keeping peaks and the moment a population collapses.
+        with span("build line chart", "build", lines=len(chartSeries)):
+            add_series(lineChart, chartSeries,
+                       x_labels=[f"{t:g}" for t in time_points], max_points=maxChartPoints)
+
+        # ── RENDER THE CHART ──────────────────────────────────────────────────────
+        # Save the finished chart as an SVG file.
+        # SVG (Scalable Vector Graphics) is an interactive format that can be:
+        #   - opened directly in a web browser
+        #   - embedded into a web page
+        #   - scaled to any size without losing quality
+        with span("render line chart", "render", output=chartFile):
+            lineChart.render_to_file(chartFile)
+        store_svg(cache, chartKey, chartFile)
 
-    # Add this scenario's population history as a line on the chart.
-    # The label (e.g. "Moderate Harvest") will appear in the chart legend.
-    lineChart.add(scenario["label"], popHistory)
+    print(cache_summary(cache))
 
 
-# ── RENDER THE CHART ──────────────────────────────────────────────────────────
-# Save the finished chart as an SVG file.
-# SVG (Scalable Vector Graphics) is an interactive format that can be:
-#   - opened directly in a web browser
-#   - embedded into a web page
-#   - scaled to any size without losing quality
-lineChart.render_to_file('fish_population_what_if.svg')
+if __name__ == "__main__":
+    main()
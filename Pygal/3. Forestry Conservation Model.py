@@ -21,7 +21,16 @@
 #   humidity       - relative air humidity as a percentage (0% = dry air, 100% = saturated)
 
 
-import pygal
+import sys
+
+import numpy as np
+
+import downsampling
+from downsampling import DEFAULT_MAX_POINTS, add_series
+from forest_engines import remaining_forest_cover
+from instrumentation import span, traced
+from model_cache import (cache_key, cache_summary, cached_series, open_cache, pygal_version,
+                         restore_svg, store_svg)
 
 
 # Returns: a fire risk score between 0 (no risk) and 100 (extreme risk)
@@ -46,7 +55,10 @@ def calculate_fire_risk(temperature, soil_moisture, wind_speed, humidity):
     # Add all factors together to get a raw risk score
     raw_score = temp_factor + moisture_factor + wind_factor + humidity_factor
 
-    # Clamp the result to the range 0-100 so it always represents a percentage
+    # Clamp the result to the range 0-100 so it always represents a percentage.
+    # The same formula works on NumPy arrays, scoring thousands of days at once.
+    if isinstance(raw_score, np.ndarray):
+        return np.clip(raw_score, 0, 100)
     return min(max(raw_score, 0), 100)
 
 
@@ -55,6 +67,7 @@ def calculate_fire_risk(temperature, soil_moisture, wind_speed, humidity):
 # environmental conditions slightly each step to simulate changing weather.
 
 # NOTE: In a more advanced version, you could load real weather data here!
+# (load_daily_fire_risk in forest_engines.py does exactly that for large weather CSV files.)
 
 #
 # Parameters:
@@ -67,6 +80,7 @@ def calculate_fire_risk(temperature, soil_moisture, wind_speed, humidity):
 #   moisture_loss      - how much soil moisture drops each step (models a dry period)
 #
 # Returns: a list of fire risk scores, one per time step
+@traced("simulate", steps="steps")
 def simulate_fire_risk(base_temperature, base_soil_moisture, base_wind_speed,
                        base_humidity, steps, temp_increase=0.5, moisture_loss=1.0):
     risk_history = []
@@ -90,6 +104,16 @@ def simulate_fire_risk(base_temperature, base_soil_moisture, base_wind_speed,
     return risk_history
 
 
+# ── BIGGER FORESTRY MODELS ────────────────────────────────────────────────────
+# forest_engines.py builds on these models to answer bigger questions:
+#   - simulate_fire_risk_ensemble - the spread of fire risk over many random weathers
+#   - simulate_fire_spread        - a fire spreading across a grid of forest cells
+#   - load_daily_fire_risk        - daily fire risk from real weather files
+#   - sweep_logging               - millions of logging scenarios at once
+# The fire engines are given the fire risk model to use, e.g.
+#   simulate_fire_risk_ensemble(calculate_fire_risk, 35, 30, 40, 20, steps=30)
+
+
 # ── ILLEGAL LOGGING MODEL ─────────────────────────────────────────────────────
 # Models the loss of forest cover due to illegal logging over a number of periods.
 # Each period, a percentage of the remaining forest is lost.
@@ -103,6 +127,7 @@ def simulate_fire_risk(base_temperature, base_soil_moisture, base_wind_speed,
 #                           (0.0 = no effect, 1.0 = logging completely stopped)
 #
 # Returns: a list of forest cover values, one per period
+@traced("simulate", steps="periods")
 def simulate_logging(initial_forest_cover, logging_rate, periods, conservation_factor=0.0):
     cover_history = []
     current_cover = initial_forest_cover
@@ -120,12 +145,32 @@ def simulate_logging(initial_forest_cover, logging_rate, periods, conservation_f
     return cover_history
 
 
+# Runs the logging model on the forest that survived a fire, so the two
+# threats can be combined: first the fire, then logging of what is left.
+#
+# Parameters:
+#   grid          - the grid returned by simulate_fire_spread
+#   cell_hectares - the area of one grid cell in hectares
+#   the rest are the same as simulate_logging
+#
+# Returns: a list of forest cover values, one per period
+def simulate_logging_after_fire(grid, logging_rate, periods, conservation_factor=0.0,
+                                cell_hectares=1.0):
+    return simulate_logging(
+        initial_forest_cover = remaining_forest_cover(grid, cell_hectares),
+        logging_rate         = logging_rate,
+        periods              = periods,
+        conservation_factor  = conservation_factor
+    )
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 # SCENARIO DEFINITIONS
 # Students can edit the values below to explore their own "what-if" questions.
 # ══════════════════════════════════════════════════════════════════════════════
 
 simulation_steps = 30  # number of days (fire model) or months (logging model)
+max_chart_points = DEFAULT_MAX_POINTS  # longer runs are downsampled before drawing
 
 
 # ── FIRE RISK SCENARIOS ───────────────────────────────────────────────────────
@@ -171,69 +216,118 @@ logging_scenarios = [
 ]
 
 
-# ══════════════════════════════════════════════════════════════════════════════
-# CHART 1: FIRE RISK — LINE CHART
-# A line chart suits fire risk because risk changes continuously over time.
-# Students can clearly see the point where risk accelerates and becomes critical.
-# ══════════════════════════════════════════════════════════════════════════════
-
-fire_chart = pygal.Line(
-    title        = 'Forest Fire Risk Over Time: What-if Scenarios',
-    x_title      = 'Day',
-    y_title      = 'Fire Risk Score (0 = Safe, 100 = Extreme)',
-    x_label_rotation = 45,
-    show_minor_x_labels = False
-)
-
-# Label the x-axis with day numbers
-fire_chart.x_labels = [f"Day {d + 1}" for d in range(simulation_steps)]
-
-# Run each fire scenario and add it as a line on the chart
-for scenario in fire_scenarios:
-    risk_data = simulate_fire_risk(
-        base_temperature   = scenario["base_temperature"],
-        base_soil_moisture = scenario["base_soil_moisture"],
-        base_wind_speed    = scenario["base_wind_speed"],
-        base_humidity      = scenario["base_humidity"],
-        steps              = simulation_steps,
-        temp_increase      = scenario["temp_increase"],
-        moisture_loss      = scenario["moisture_loss"]
+# ── MAIN PROGRAM ──────────────────────────────────────────────────────────────
+# Everything above can be imported and reused (e.g. simulate_fire_risk,
+# simulate_logging) without drawing anything. The charts are only built when
+# this file is run.
+def main():
+    # Results and charts are saved in a cache (see model_cache.py). If nothing that
+    # affects a chart has changed since the last run, the saved chart is reused
+    # and no simulation or rendering happens at all.
+    cache = open_cache()
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # CHART 1: FIRE RISK — LINE CHART
+    # A line chart suits fire risk because risk changes continuously over time.
+    # Students can clearly see the point where risk accelerates and becomes critical.
+    # ══════════════════════════════════════════════════════════════════════════
+
+    fire_chart_config = dict(
+        title        = 'Forest Fire Risk Over Time: What-if Scenarios',
+        x_title      = 'Day',
+        y_title      = 'Fire Risk Score (0 = Safe, 100 = Extreme)',
+        x_label_rotation = 45,
+        show_minor_x_labels = False
     )
-    fire_chart.add(scenario["label"], risk_data)
-
-# Save the fire risk chart as an interactive SVG file
-fire_chart.render_to_file('forest_fire_risk.svg')
-print("Fire risk chart saved to forest_fire_risk.svg")
-
-
-# ══════════════════════════════════════════════════════════════════════════════
-# CHART 2: ILLEGAL LOGGING — BAR CHART
-# A bar chart suits logging because forest loss is measured in discrete periods.
-# Side-by-side bars make it easy to compare protected vs. unprotected forest
-# at each point in time, clearly showing the impact of conservation over months.
-# ══════════════════════════════════════════════════════════════════════════════
-
-logging_chart = pygal.Bar(
-    title   = 'Forest Cover Over Time: Impact of Illegal Logging',
-    x_title = 'Month',
-    y_title = 'Forest Cover (hectares)',
-    x_label_rotation = 45,
-    show_minor_x_labels = False
-)
-
-# Label the x-axis with month numbers
-logging_chart.x_labels = [f"Month {m + 1}" for m in range(simulation_steps)]
-
-# Run each logging scenario and add it as a bar series on the chart
-for scenario in logging_scenarios:
-    cover_data = simulate_logging(
-        initial_forest_cover = scenario["initial_forest_cover"],
-        logging_rate         = scenario["logging_rate"],
-        periods              = simulation_steps,
-        conservation_factor  = scenario["conservation_factor"]
+    fire_chart_key = cache_key([simulate_fire_risk, calculate_fire_risk, sys.modules[__name__],
+                                downsampling],
+                               fire_scenarios, simulation_steps, fire_chart_config,
+                               max_chart_points, pygal_version())
+
+    if not restore_svg(cache, fire_chart_key, 'forest_fire_risk.svg'):
+        # pygal is only loaded when a chart actually needs drawing
+        import pygal
+        fire_chart = pygal.Line(**fire_chart_config)
+
+        # Run each fire scenario and collect it as a line for the chart
+        fire_series = []
+        for scenario in fire_scenarios:
+            fire_params = dict(
+                base_temperature   = scenario["base_temperature"],
+                base_soil_moisture = scenario["base_soil_moisture"],
+                base_wind_speed    = scenario["base_wind_speed"],
+                base_humidity      = scenario["base_humidity"],
+                steps              = simulation_steps,
+                temp_increase      = scenario["temp_increase"],
+                moisture_loss      = scenario["moisture_loss"]
+            )
+            risk_data = cached_series(cache, [simulate_fire_risk, calculate_fire_risk], fire_params,
+                                      lambda: simulate_fire_risk(**fire_params))
+            fire_series.append((scenario["label"], risk_data))
+
+        # Add the lines, labelling the x-axis with day numbers.
+        # Long runs are downsampled to max_chart_points, keeping the peak risk visible.
+        with span("build fire risk chart", "build", lines=len(fire_series)):
+            add_series(fire_chart, fire_series,
+                       x_labels=[f"Day {d + 1}" for d in range(simulation_steps)],
+                       max_points=max_chart_points)
+
+        # Save the fire risk chart as an interactive SVG file
+        with span("render fire risk chart", "render", output='forest_fire_risk.svg'):
+            fire_chart.render_to_file('forest_fire_risk.svg')
+        store_svg(cache, fire_chart_key, 'forest_fire_risk.svg')
+
+    print("Fire risk chart saved to forest_fire_risk.svg")
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # CHART 2: ILLEGAL LOGGING — BAR CHART
+    # A bar chart suits logging because forest loss is measured in discrete periods.
+    # Side-by-side bars make it easy to compare protected vs. unprotected forest
+    # at each point in time, clearly showing the impact of conservation over months.
+    # ══════════════════════════════════════════════════════════════════════════
+
+    logging_chart_config = dict(
+        title   = 'Forest Cover Over Time: Impact of Illegal Logging',
+        x_title = 'Month',
+        y_title = 'Forest Cover (hectares)',
+        x_label_rotation = 45,
+        show_minor_x_labels = False
     )
-    logging_chart.add(scenario["label"], cover_data)
-
-# Save the logging chart as an interactive SVG file
-logging_chart.render_to_file('forest_logging_impact.svg')
-print("Logging impact chart saved to forest_logging_impact.svg")
+    logging_chart_key = cache_key([simulate_logging, sys.modules[__name__], downsampling],
+                                  logging_scenarios, simulation_steps, logging_chart_config,
+                                  max_chart_points, pygal_version())
+
+    if not restore_svg(cache, logging_chart_key, 'forest_logging_impact.svg'):
+        import pygal
+        logging_chart = pygal.Bar(**logging_chart_config)
+
+        # Run each logging scenario and collect it as a bar series for the chart
+        logging_series = []
+        for scenario in logging_scenarios:
+            logging_params = dict(
+                initial_forest_cover = scenario["initial_forest_cover"],
+                logging_rate         = scenario["logging_rate"],
+                periods              = simulation_steps,
+                conservation_factor  = scenario["conservation_factor"]
+            )
+            cover_data = cached_series(cache, simulate_logging, logging_params,
+                                       lambda: simulate_logging(**logging_params))
+            logging_series.append((scenario["label"], cover_data))
+
+        # Add the bars, labelling the x-axis with month numbers
+        with span("build logging chart", "build", lines=len(logging_series)):
+            add_series(logging_chart, logging_series,
+                       x_labels=[f"Month {m + 1}" for m in range(simulation_steps)],
+                       max_points=max_chart_points)
+
+        # Save the logging chart as an interactive SVG file
+        with span("render logging chart", "render", output='forest_logging_impact.svg'):
+            logging_chart.render_to_file('forest_logging_impact.svg')
+        store_svg(cache, logging_chart_key, 'forest_logging_impact.svg')
+
+    print("Logging impact chart saved to forest_logging_impact.svg")
+    print(cache_summary(cache))
+
+
+if __name__ == "__main__":
+    main()
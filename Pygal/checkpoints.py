@@ -0,0 +1,127 @@
+# ----------------------------------------
+# Pygal Modelling - Checkpoints
+# ----------------------------------------
+#
+# Running a model for longer (more years, more time steps) normally means
+# starting again from step zero. A checkpoint saves where a run got to, so it
+# can carry on from there instead:
+#   - the parameters the run was started with
+#   - the step it reached
+#   - the model's state at that step (e.g. the current population, or the
+#     state of a random number generator for a random model)
+#   - every value calculated so far
+#
+# A checkpoint is two files with the same name:
+#   <name>.json   - the parameters, step and state (small, rewritten each save)
+#   <name>.series - the values as raw 8-byte floats; new values are added to
+#                   the end, so saving never rewrites the earlier history
+#
+# If a run is interrupted while saving, the .json file still describes the
+# last complete save (it is replaced in one go) and any extra values at the
+# end of the .series file are cut off when the checkpoint is next opened.
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+SERIES_DTYPE = np.dtype("<f8")
+
+
+def series_path(path):
+    return path + ".series"
+
+
+def state_path(path):
+    return path + ".json"
+
+
+# Opens a checkpoint, or starts a new empty one (and its folder) if none
+# exists yet.
+#
+# Parameters:
+#   path   - the checkpoint name (without .json / .series)
+#   model  - the name of the model, e.g. "fish"
+#   params - the model's parameters (numbers or text). A checkpoint can only
+#            be extended by a run with exactly the same parameters.
+#
+# Returns: a dictionary with the path, model, params, step and state
+def open_checkpoint(path, model, params):
+    checkpoint = {"path": path, "model": model, "params": params, "step": 0, "state": None}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    try:
+        with open(state_path(path), encoding="utf-8") as state_file:
+            saved = json.load(state_file)
+    except FileNotFoundError:
+        saved = None
+
+    if saved is not None:
+        if saved["model"] != model or saved["params"] != json.loads(json.dumps(params)):
+            raise ValueError(f"checkpoint {path!r} was made by a different model or with "
+                             f"different parameters: {saved['model']} {saved['params']}")
+
+        stored = os.path.getsize(series_path(path)) // SERIES_DTYPE.itemsize \
+            if os.path.exists(series_path(path)) else 0
+        if stored >= saved["values"]:
+            checkpoint["step"] = saved["step"]
+            checkpoint["state"] = saved["state"]
+            checkpoint["values"] = saved["values"]
+        else:
+            saved = None  # values are missing, so the run can't carry on: start again
+
+    if saved is None:
+        checkpoint["values"] = 0
+
+    # Cut off anything written after the last complete save
+    with open(series_path(path), "ab") as series_file:
+        series_file.truncate(checkpoint["values"] * SERIES_DTYPE.itemsize)
+    return checkpoint
+
+
+# Returns: every value saved in the checkpoint so far, as a NumPy array
+def read_series(checkpoint):
+    if checkpoint["values"] == 0:
+        return np.empty(0, dtype=SERIES_DTYPE)
+    return np.fromfile(series_path(checkpoint["path"]), dtype=SERIES_DTYPE,
+                       count=checkpoint["values"])
+
+
+# Adds newly calculated values to the end of the checkpoint and records the
+# step and model state they lead up to.
+def save_progress(checkpoint, new_values, step, state):
+    with open(series_path(checkpoint["path"]), "ab") as series_file:
+        np.asarray(new_values, dtype=SERIES_DTYPE).tofile(series_file)
+        series_file.flush()
+        os.fsync(series_file.fileno())
+
+    checkpoint["values"] += len(new_values)
+    checkpoint["step"] = step
+    checkpoint["state"] = state
+
+    # Write the new state to a temporary file, then swap it in, so there is
+    # always one complete state file even if the program stops half-way
+    directory = os.path.dirname(os.path.abspath(checkpoint["path"]))
+    handle, temporary_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".json")
+    with os.fdopen(handle, "w", encoding="utf-8") as state_file:
+        json.dump({
+            "model": checkpoint["model"],
+            "params": checkpoint["params"],
+            "step": step,
+            "state": state,
+            "values": checkpoint["values"],
+        }, state_file)
+    os.replace(temporary_path, state_path(checkpoint["path"]))
+
+
+# ── MANY SCENARIOS ────────────────────────────────────────────────────────────
+# Each scenario of a multi-scenario run gets its own checkpoint in one folder,
+# named after a hash of its parameters. If the run is interrupted, running it
+# again finds the finished scenarios already complete and only works on the
+# rest.
+def scenario_checkpoint_path(directory, model, params):
+    text = json.dumps([model, params], sort_keys=True)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{model}-{hashlib.sha256(text.encode()).hexdigest()[:16]}")
@@ -0,0 +1,245 @@
+# ----------------------------------------
+# Pygal Modelling - Command line runner
+# ----------------------------------------
+#
+# Runs any of the lesson models on scenarios read from a JSON or CSV file,
+# without editing the scripts. Only the chosen model is loaded, and pygal is
+# only loaded if a chart is drawn, so batch jobs start quickly.
+#
+# Examples:
+#   python cli.py fish scenarios.json --no-render
+#   python cli.py logging scenarios.csv --format csv --output results.csv
+#   python cli.py human scenarios.json --chart growth.svg
+#   python cli.py fire scenarios.json --trace trace.json
+#
+# A JSON file holds a list of scenarios (or {"scenarios": [...]}); a CSV file
+# has one scenario per row with the field names in the header. Each scenario
+# uses the same names as the lesson scripts, plus an optional "label":
+#   human   - initial_population, growth_rate, years
+#   fish    - initial_population, harvestRate, growthRate, carryingCapacity,
+#             timeStep, totalTime
+#   fire    - base_temperature, base_soil_moisture, base_wind_speed,
+#             base_humidity, steps, temp_increase, moisture_loss
+#   logging - initial_forest_cover, logging_rate, periods, conservation_factor
+# Missing values fall back to the defaults used in the scripts.
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+import instrumentation
+from parallel import load_script
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# The lesson script each model lives in (the file names contain spaces, so
+# they are loaded by path rather than with a normal import)
+MODEL_FILES = {
+    "human":   "1. Human population.py",
+    "fish":    "2. Fish Population.py",
+    "fire":    "3. Forestry Conservation Model.py",
+    "logging": "3. Forestry Conservation Model.py",
+}
+
+MODULE_NAMES = {
+    "1. Human population.py":            "human_population",
+    "2. Fish Population.py":             "fish_population",
+    "3. Forestry Conservation Model.py": "forestry_conservation",
+}
+
+
+# Loads a lesson script as a module. Nothing is drawn, because the charts are
+# only built when a script is run directly. Loading it with load_script (see
+# parallel.py) also lets worker processes find the model functions.
+def load_model_module(model):
+    file_name = MODEL_FILES[model]
+    return load_script(MODULE_NAMES[file_name], os.path.join(HERE, file_name))
+
+
+# ── RUNNING ONE SCENARIO ──────────────────────────────────────────────────────
+# Each function fills in defaults from the script, runs the model and returns
+# (parameters used, list of values, x-axis labels).
+def run_human(module, scenario):
+    params = {
+        "population":  scenario.get("initial_population", module.starting_population),
+        "growth_rate": scenario["growth_rate"],
+        "years":       int(scenario.get("years", module.years)),
+    }
+    values = module.run_population_model(**params)
+    return params, values, [f"Year {y + 1}" for y in range(params["years"])]
+
+
+def run_fish(module, scenario):
+    time_step = scenario.get("timeStep", module.timeStep)
+    params = {
+        "initialPopulation": scenario["initial_population"],
+        "harvestRate":       scenario["harvestRate"],
+        "growthRate":        scenario.get("growthRate", module.growthRate),
+        "carryingCapacity":  scenario.get("carryingCapacity", module.carryingCapacity),
+        "timeStep":          time_step,
+        "numSteps":          int(scenario.get("totalTime", module.totalTime) / time_step),
+    }
+    values = module.runFishScenario(**params)
+    return params, values, [f"{step * time_step:g}" for step in range(params["numSteps"] + 1)]
+
+
+def run_fire(module, scenario):
+    params = {
+        "base_temperature":   scenario["base_temperature"],
+        "base_soil_moisture": scenario["base_soil_moisture"],
+        "base_wind_speed":    scenario["base_wind_speed"],
+        "base_humidity":      scenario["base_humidity"],
+        "steps":              int(scenario.get("steps", module.simulation_steps)),
+        "temp_increase":      scenario.get("temp_increase", 0.5),
+        "moisture_loss":      scenario.get("moisture_loss", 1.0),
+    }
+    values = module.simulate_fire_risk(**params)
+    return params, values, [f"Day {d + 1}" for d in range(params["steps"])]
+
+
+def run_logging(module, scenario):
+    params = {
+        "initial_forest_cover": scenario["initial_forest_cover"],
+        "logging_rate":         scenario["logging_rate"],
+        "periods":              int(scenario.get("periods", module.simulation_steps)),
+        "conservation_factor":  scenario.get("conservation_factor", 0.0),
+    }
+    values = module.simulate_logging(**params)
+    return params, values, [f"Month {m + 1}" for m in range(params["periods"])]
+
+
+RUNNERS = {"human": run_human, "fish": run_fish, "fire": run_fire, "logging": run_logging}
+
+CHART_SETTINGS = {
+    "human":   ("Line", "Human Population Growth", "Year", "Population"),
+    "fish":    ("Line", "Fish Population", "Time", "Fish Population"),
+    "fire":    ("Line", "Forest Fire Risk Over Time", "Day", "Fire Risk Score"),
+    "logging": ("Bar", "Forest Cover Over Time", "Month", "Forest Cover (hectares)"),
+}
+
+
+# ── READING SCENARIO FILES ────────────────────────────────────────────────────
+# Turns CSV text into numbers where possible ("0.05" -> 0.05, "1000" -> 1000)
+def parse_value(text):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def read_scenarios(path):
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as csv_file:
+            return [{name: parse_value(value) for name, value in row.items() if value != ""}
+                    for row in csv.DictReader(csv_file)]
+
+    with open(path, encoding="utf-8") as json_file:
+        data = json.load(json_file)
+    if isinstance(data, dict):
+        if "scenarios" not in data:
+            raise ValueError('expected a list of scenarios or {"scenarios": [...]}')
+        return data["scenarios"]
+    return data
+
+
+# ── OUTPUT ────────────────────────────────────────────────────────────────────
+def write_results(model, results, output_format, output_file):
+    if output_format == "json":
+        json.dump({"model": model, "results": [
+            {"label": label, "params": params, "values": values}
+            for label, params, values, _ in results
+        ]}, output_file)
+        output_file.write("\n")
+    else:
+        writer = csv.writer(output_file)
+        writer.writerow(["label", "step", "x", "value"])
+        for label, params, values, x_labels in results:
+            for step, (x, value) in enumerate(zip(x_labels, values)):
+                writer.writerow([label, step, x, value])
+
+
+# All lines on a chart share one x-axis, so scenarios may run for different
+# lengths (their labels are then taken from the longest) but must use the same
+# steps, e.g. the same fish timeStep.
+#
+# Returns: the x labels for the chart
+def chart_x_labels(results):
+    longest = max((x_labels for _, _, _, x_labels in results), key=len, default=None)
+    for label, _, _, x_labels in results:
+        if x_labels != longest[:len(x_labels)]:
+            raise ValueError(f"{label!r} doesn't use the same x-axis steps as the longest scenario, "
+                             f"so they can't share one chart")
+    return longest
+
+
+def render_chart(model, results, chart_path, max_points):
+    import pygal
+    from downsampling import add_series
+
+    chart_type, title, x_title, y_title = CHART_SETTINGS[model]
+    chart = getattr(pygal, chart_type)(title=title, x_title=x_title, y_title=y_title,
+                                       x_label_rotation=45, show_minor_x_labels=False)
+    with instrumentation.span(f"build {chart_type.lower()} chart", "build", lines=len(results)):
+        add_series(chart, [(label, values) for label, _, values, _ in results],
+                   x_labels=chart_x_labels(results), max_points=max_points)
+    with instrumentation.span(f"render {chart_type.lower()} chart", "render", output=chart_path):
+        chart.render_to_file(chart_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a lesson model on scenarios from a file.")
+    parser.add_argument("model", choices=sorted(RUNNERS), help="which model to run")
+    parser.add_argument("scenarios", help="JSON or CSV file of scenarios")
+    parser.add_argument("--no-render", action="store_true", help="don't draw a chart (pygal isn't loaded)")
+    parser.add_argument("--chart", help="SVG file for the chart (default: <model>_scenarios.svg)")
+    parser.add_argument("--max-points", type=int, default=1000, help="most points per chart line")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="output format")
+    parser.add_argument("--output", help="file to write results to (default: standard output)")
+    parser.add_argument("--trace", help="record a timing trace of every model call in this file "
+                                        "(same as setting MODEL_TRACE)")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        instrumentation.enable(args.trace)  # before loading the model, so its functions are traced
+    try:
+        scenarios = read_scenarios(args.scenarios)
+    except (OSError, ValueError) as error:
+        parser.error(f"can't read scenarios from {args.scenarios}: {error}")
+
+    module = load_model_module(args.model)
+    results = []
+    for number, scenario in enumerate(scenarios, start=1):
+        # A missing field usually means the file was written for a different model
+        if not isinstance(scenario, dict):
+            parser.error(f"scenario {number} should be a set of named fields, got {scenario!r}")
+        try:
+            params, values, x_labels = RUNNERS[args.model](module, scenario)
+        except KeyError as error:
+            parser.error(f"scenario {number} has no {error.args[0]!r} field, "
+                         f"which the {args.model} model needs")
+        except (TypeError, ValueError) as error:
+            parser.error(f"scenario {number} has a value the {args.model} model can't use: {error}")
+        results.append((scenario.get("label", f"Scenario {number}"), params, values, x_labels))
+
+    if not args.no_render:
+        try:
+            chart_x_labels(results)
+        except ValueError as error:
+            parser.error(f"{error} (use --no-render to only write the results)")
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as output_file:
+            write_results(args.model, results, args.format, output_file)
+    else:
+        write_results(args.model, results, args.format, sys.stdout)
+
+    if not args.no_render:
+        render_chart(args.model, results, args.chart or f"{args.model}_scenarios.svg", args.max_points)
+
+
+if __name__ == "__main__":
+    main()
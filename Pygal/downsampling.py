@@ -0,0 +1,137 @@
+# ----------------------------------------
+# Pygal Modelling - Chart downsampling
+# ----------------------------------------
+#
+# pygal draws one SVG element for every point on a chart. That is fine for a
+# few hundred points, but a simulation with a million steps produces an SVG
+# that takes minutes to render and is too big for a browser to open.
+#
+# Every chart goes through add_series() below. If a chart has more points than
+# max_points, it is reduced using the Largest-Triangle-Three-Buckets (LTTB)
+# method, which keeps the points that matter most to the shape of each line.
+# Charts small enough to draw as they are pass through unchanged.
+
+import numpy as np
+
+DEFAULT_MAX_POINTS = 1000  # most points drawn along the x-axis of one chart
+
+
+# ── LARGEST-TRIANGLE-THREE-BUCKETS ────────────────────────────────────────────
+# The points between the first and last are split into equal "buckets", and one
+# point is kept from each. Going left to right, the kept point is the one that
+# makes the biggest triangle with the point kept from the previous bucket and
+# the average of the next bucket — the point that stands out the most.
+#
+# Parameters:
+#   values - the y values of one series
+#   target - how many points to keep
+#
+# Returns: a sorted array of the indexes to keep
+def lttb_indices(values, target):
+    values = np.asarray(values, dtype=float)
+    n = values.size
+    if target >= n or n <= 2:
+        return np.arange(n)
+    if target < 3:
+        return np.array([0, n - 1])
+
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, target - 1).astype(int)  # bucket boundaries
+    kept = np.empty(target, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+    previous = 0
+
+    for bucket in range(target - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+
+        # Average of the next bucket (or the last point, for the final bucket)
+        next_start = stop
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        average_x = x[next_start:next_stop].mean()
+        average_y = values[next_start:next_stop].mean()
+
+        # Twice the area of the triangle made with each candidate point
+        area = np.abs(
+            (x[previous] - average_x) * (values[start:stop] - values[previous])
+            - (x[previous] - x[start:stop]) * (average_y - values[previous])
+        )
+        previous = start + int(np.argmax(area))
+        kept[bucket + 1] = previous
+
+    return kept
+
+
+# ── FEATURES THAT MUST STAY VISIBLE ───────────────────────────────────────────
+# LTTB keeps the overall shape, but it can still skip the exact point students
+# are looking for. These points are always kept:
+#   - the first and last point
+#   - the highest and lowest values, including where a flat peak or trough
+#     starts and ends (e.g. fire risk reaching the 100 cap)
+#   - the collapse point: the first zero after a positive value (extinction)
+#
+# Returns: a sorted array of the indexes to keep
+def feature_indices(values):
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return np.array([], dtype=int)
+
+    features = {0, values.size - 1}
+    for extreme in (values.max(), values.min()):
+        matches = np.flatnonzero(values == extreme)
+        features.update((int(matches[0]), int(matches[-1])))
+
+    collapses = np.flatnonzero((values[1:] <= 0) & (values[:-1] > 0))
+    if collapses.size:
+        features.add(int(collapses[0]) + 1)
+
+    return np.array(sorted(features), dtype=int)
+
+
+# ── CHOOSING POINTS FOR A WHOLE CHART ─────────────────────────────────────────
+# All lines on a pygal chart share the same x labels, so every series must keep
+# the same indexes. The features of every series are reserved first; whatever
+# is left of max_points is split equally between the series for their LTTB
+# points. The chart never keeps more than max_points points. (With so many
+# series that even their features don't fit, an evenly spread selection of the
+# features is kept.)
+#
+# Returns: a sorted array of the indexes to keep
+def chart_indices(series_values, max_points=DEFAULT_MAX_POINTS):
+    length = max((len(values) for values in series_values), default=0)
+    if length <= max_points:
+        return np.arange(length)
+
+    features = np.unique(np.concatenate([feature_indices(values) for values in series_values]))
+    if features.size >= max_points:
+        return np.unique(features[np.linspace(0, features.size - 1, max_points).round().astype(int)])
+
+    share = (max_points - features.size) // len(series_values)
+    kept = [features]
+    if share >= 3:
+        for values in series_values:
+            kept.append(lttb_indices(values, share))
+    return np.unique(np.concatenate(kept))
+
+
+# Adds every series to a pygal chart, downsampling them first if there are
+# more than max_points points. The x labels are reduced to match, so each
+# label still sits under the point it belongs to.
+#
+# Parameters:
+#   chart      - a pygal chart (Line, Bar, ...)
+#   series     - a list of (label, values) pairs
+#   x_labels   - optional list of x-axis labels, one per point
+#   max_points - most points to keep along the x-axis
+def add_series(chart, series, x_labels=None, max_points=DEFAULT_MAX_POINTS):
+    series = list(series)
+    indices = chart_indices([values for label, values in series], max_points)
+
+    if x_labels is not None:
+        chart.x_labels = [x_labels[index] for index in indices]
+
+    for label, values in series:
+        if len(values) == len(indices):
+            chart.add(label, values)
+        else:
+            chart.add(label, np.asarray(values)[indices[indices < len(values)]].tolist())
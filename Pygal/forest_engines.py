@@ -0,0 +1,598 @@
+# ----------------------------------------
+# Pygal Modelling - Forestry engines
+# ----------------------------------------
+#
+# Bigger versions of the models in "3. Forestry Conservation Model.py", for
+# questions the lesson's simple models can't answer on their own:
+#   - Monte Carlo weather ensembles (how uncertain is the fire risk?)
+#   - fire spreading across a grid of forest cells
+#   - fire risk scored from real weather files
+#   - logging parameter sweeps over millions of combinations
+#
+# The fire engines take the fire risk model as their first argument
+# (risk_model), so they always use the lesson's calculate_fire_risk rather
+# than a copy of its formula. Big jobs are spread over several CPU cores with
+# map_jobs (see parallel.py).
+
+import csv
+import re
+from itertools import islice
+
+import numpy as np
+
+from instrumentation import traced
+from parallel import map_jobs
+
+
+# ── MONTE CARLO WEATHER ENSEMBLES ─────────────────────────────────────────────
+# Real weather doesn't follow a straight line. An ensemble runs the fire risk
+# simulation many times ("members"), each with its own random weather, and
+# looks at the spread of results instead of a single answer.
+#
+# Each weather variable follows its simulate_fire_risk trend plus a random wobble
+# that changes a little each day (an AR(1) process):
+#   wobble today = persistence × wobble yesterday + random noise
+# A persistence of 1 gives a random walk; 0 gives fresh noise every day.
+#
+# Every member is stored in NumPy arrays and the whole ensemble moves forward
+# one day at a time, so calculate_fire_risk scores every member at once with
+# no Python loop over members. Members are split into chunks that run on
+# separate CPU cores. Each chunk only returns, for each day, how many members
+# landed on each risk score (0.0, 0.1, ... 100.0, the same rounding as
+# simulate_fire_risk), so the chunks add together exactly.
+
+RISK_LEVELS = 1001  # risk scores 0.0 to 100.0 in steps of 0.1
+
+# How big the daily random noise is for each variable (standard deviation)
+DEFAULT_WEATHER_NOISE = {
+    "temperature":   1.5,   # °C
+    "soil_moisture": 2.0,   # %
+    "wind_speed":    5.0,   # km/h
+    "humidity":      5.0,   # %
+}
+
+
+# Rounds an array to one decimal place exactly like round(value, 1).
+# NumPy rounds by scaling by 10 first, which can nudge a value sitting on a
+# halfway point (e.g. 45.55) to the wrong side, so those rare values use
+# Python's round() itself.
+def round_tenths(values):
+    scaled = np.asarray(values, dtype=float) * 10
+    rounded = np.rint(scaled) / 10
+    tolerance = np.maximum(1e-6, 8 * np.spacing(np.abs(scaled)))
+    halfway = np.abs(scaled - np.floor(scaled) - 0.5) < tolerance
+    if halfway.any():
+        rounded[halfway] = [round(float(value), 1) for value in np.asarray(values, dtype=float)[halfway]]
+    return rounded
+
+
+# Converts risk scores to whole tenths (45.6 -> 456), rounding like round(risk, 1)
+def risk_levels(risk):
+    return np.rint(round_tenths(risk) * 10).astype(np.intp)
+
+
+# Simulates one chunk of ensemble members (one job for map_jobs).
+#
+# Returns: a (steps × RISK_LEVELS) array counting the members at each risk score each day
+def fire_ensemble_counts(risk_model, params, members, noise, persistence, seed):
+    rng = np.random.default_rng(seed)
+    counts = np.zeros((params["steps"], RISK_LEVELS), dtype=np.int64)
+
+    # Today's wobble: one row per variable, one column per member. It starts at
+    # zero because day 1 is today's known weather.
+    names = list(DEFAULT_WEATHER_NOISE)
+    scale = np.array([[noise[name]] for name in names])
+    wobble = np.zeros((len(names), members))
+    temperature, soil_moisture, wind_speed, humidity = wobble
+
+    for step in range(params["steps"]):
+        if step > 0:
+            wobble *= persistence
+            wobble += scale * rng.standard_normal((len(names), members))
+
+        risk = risk_model(
+            temperature   = params["base_temperature"] + step * params["temp_increase"] + temperature,
+            soil_moisture = np.clip(params["base_soil_moisture"] - step * params["moisture_loss"]
+                                    + soil_moisture, 0, 100),
+            wind_speed    = np.maximum(params["base_wind_speed"] + wind_speed, 0),
+            humidity      = np.clip(params["base_humidity"] + humidity, 0, 100)
+        )
+        counts[step] = np.bincount(risk_levels(risk), minlength=RISK_LEVELS)
+
+    return counts
+
+
+# Reads a percentile from per-day risk counts (nearest-rank method)
+def percentile_from_counts(counts, percent):
+    cumulative = np.cumsum(counts, axis=1)
+    rank = np.maximum(np.ceil(percent / 100 * cumulative[:, -1]), 1)
+    level = np.array([np.searchsorted(row, target) for row, target in zip(cumulative, rank)])
+    return (level / 10).tolist()
+
+
+# Parameters:
+#   risk_model  - the fire risk function, e.g. calculate_fire_risk
+#   the same as simulate_fire_risk, plus:
+#   members     - how many random weather trajectories to simulate (at least 1)
+#   threshold   - risk score counted as dangerous for the exceedance probability
+#   noise       - daily noise for each variable (see DEFAULT_WEATHER_NOISE)
+#   persistence - how much of yesterday's wobble carries over (0 to 1)
+#   seed        - seed for the random numbers (same seed = same ensemble)
+#   workers     - number of processes to use (None = one per CPU core)
+#   chunk_size  - how many members each process simulates at once
+#
+# Returns: a dictionary of lists with one value per day:
+#   "p5", "p50", "p95" - the 5th, 50th (median) and 95th percentile risk score
+#   "exceedance"       - the fraction of members with risk above the threshold
+@traced("simulate", steps="steps")
+def simulate_fire_risk_ensemble(risk_model, base_temperature, base_soil_moisture,
+                                base_wind_speed, base_humidity, steps, temp_increase=0.5,
+                                moisture_loss=1.0, members=1000, threshold=75, noise=None,
+                                persistence=0.8, seed=None, workers=None, chunk_size=10_000):
+    if members < 1:
+        raise ValueError(f"members must be at least 1, not {members}")
+    if not 0 <= persistence <= 1:
+        raise ValueError(f"persistence must be from 0 to 1, not {persistence}")
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, not {chunk_size}")
+
+    params = {
+        "base_temperature":   base_temperature,
+        "base_soil_moisture": base_soil_moisture,
+        "base_wind_speed":    base_wind_speed,
+        "base_humidity":      base_humidity,
+        "steps":              steps,
+        "temp_increase":      temp_increase,
+        "moisture_loss":      moisture_loss,
+    }
+    noise = {**DEFAULT_WEATHER_NOISE, **(noise or {})}
+
+    # Each chunk gets its own independent random stream, so the result only
+    # depends on the seed and chunk_size, not on how many workers are used
+    sizes = [min(chunk_size, members - start) for start in range(0, members, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(risk_model, params, size, noise, persistence, chunk_seed)
+            for size, chunk_seed in zip(sizes, seeds)]
+
+    counts = np.zeros((steps, RISK_LEVELS), dtype=np.int64)
+    for chunk_counts in map_jobs(fire_ensemble_counts, jobs, workers):
+        counts += chunk_counts
+    dangerous = np.arange(RISK_LEVELS) > round(threshold * 10)
+
+    return {
+        "p5":         percentile_from_counts(counts, 5),
+        "p50":        percentile_from_counts(counts, 50),
+        "p95":        percentile_from_counts(counts, 95),
+        "exceedance": (counts[:, dangerous].sum(axis=1) / max(members, 1)).tolist(),
+    }
+
+
+# ── SPATIAL FIRE SPREAD ───────────────────────────────────────────────────────
+# The models above give one risk score for the whole forest. This one splits
+# the forest into a grid of cells (a "cellular automaton") to show where a fire
+# actually spreads. Every cell is in one of four states:
+EMPTY   = 0  # no trees (a road, river or clearing) - fire can't spread here
+FUEL    = 1  # unburnt forest
+BURNING = 2  # on fire this step
+BURNT   = 3  # already burnt out
+#
+# Each step, every burning cell may set fire to its unburnt neighbours and then
+# burns out. The chance of a neighbour catching fire is its own fire risk score
+# from the fire risk model (risk 80 = 80% chance), using that cell's weather.
+# A cell next to several fires gets a chance from each of them.
+#
+# Only cells on the edge of the fire (the "active front") are looked at each
+# step, so the work depends on the size of the fire, not the size of the
+# forest. A 10,000 × 10,000 grid is stored as 100 MB of one-byte states.
+
+
+# Looks up the value of a weather raster at the given cells. A raster can be a
+# single number (the same everywhere) or a 2D array with one value per cell.
+def raster_values(raster, cells):
+    if np.ndim(raster) == 0:
+        return np.full(cells.size, float(raster))
+    return np.asarray(raster).ravel()[cells]
+
+
+# Returns the (flat) index of every neighbour of the given cells, one entry per
+# (burning cell, neighbour) pair, skipping neighbours outside the grid.
+def neighbour_cells(cells, height, width, diagonal=False):
+    rows, columns = np.divmod(cells, width)
+    offsets = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    if diagonal:
+        offsets += [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+    neighbours = []
+    for row_offset, column_offset in offsets:
+        new_rows = rows + row_offset
+        new_columns = columns + column_offset
+        inside = (new_rows >= 0) & (new_rows < height) & (new_columns >= 0) & (new_columns < width)
+        neighbours.append(new_rows[inside] * width + new_columns[inside])
+    return np.concatenate(neighbours)
+
+
+# Parameters:
+#   risk_model           - the fire risk function, e.g. calculate_fire_risk
+#   temperature, soil_moisture,
+#   wind_speed, humidity - weather rasters (single numbers or 2D arrays, one value per cell)
+#   ignitions            - list of (row, column) cells where the fire starts (inside the grid)
+#   shape                - (rows, columns) of the grid; needed if every raster is a single
+#                          number, otherwise every 2D raster must have this shape
+#   fuel                 - optional 2D True/False array: True where there are trees
+#   max_steps            - stop after this many steps even if the fire is still burning
+#   diagonal             - also spread to the four diagonal neighbours
+#   seed                 - seed for the random numbers (same seed = same fire)
+#
+# Returns: (grid, history)
+#   grid    - 2D array of cell states (EMPTY, FUEL, BURNING, BURNT)
+#   history - list of dictionaries, one per step: cells "burning" and "burnt" so far
+@traced("simulate")
+def simulate_fire_spread(risk_model, temperature, soil_moisture, wind_speed, humidity,
+                         ignitions, shape=None, fuel=None, max_steps=10_000, diagonal=False, seed=None):
+    rasters = {"fuel": fuel, "temperature": temperature, "soil_moisture": soil_moisture,
+               "wind_speed": wind_speed, "humidity": humidity}
+    grids = {name: np.shape(raster) for name, raster in rasters.items()
+             if raster is not None and np.ndim(raster) != 0}
+
+    # Every raster that isn't a single number must be a grid of the same shape
+    if shape is None:
+        if not grids:
+            raise ValueError("shape must be given when there is no fuel array and every "
+                             "weather raster is a single number")
+        shape = next(iter(grids.values()))
+    shape = tuple(shape)
+    for name, raster_shape in grids.items():
+        if raster_shape != shape:
+            raise ValueError(f"{name} has shape {raster_shape}, but the grid is {shape}")
+    height, width = shape
+    rng = np.random.default_rng(seed)
+
+    # Ignitions outside the grid would wrap round into another row, so they are
+    # refused. The same cell listed twice only starts one fire.
+    ignitions = np.asarray(ignitions, dtype=np.int64).reshape(-1, 2)
+    outside = ((ignitions < 0) | (ignitions >= (height, width))).any(axis=1)
+    if outside.any():
+        row, column = ignitions[outside][0]
+        raise ValueError(f"ignition ({row}, {column}) is outside the {height} x {width} grid")
+
+    grid = np.full(shape, FUEL, dtype=np.uint8)
+    if fuel is not None:
+        grid[~np.asarray(fuel, dtype=bool)] = EMPTY
+    cells = grid.ravel()  # a flat view of the same grid, indexed by row * width + column
+
+    burning = np.unique(ignitions[:, 0] * width + ignitions[:, 1])
+    burning = burning[cells[burning] == FUEL]
+    cells[burning] = BURNING
+
+    history = []
+    burnt = 0
+    for step in range(max_steps):
+        if burning.size == 0:
+            break
+
+        # Unburnt neighbours of the fire, and how many burning cells touch each one
+        candidates, touching = np.unique(neighbour_cells(burning, height, width, diagonal),
+                                         return_counts=True)
+        unburnt = cells[candidates] == FUEL
+        candidates, touching = candidates[unburnt], touching[unburnt]
+
+        # Each touching fire gives a chance of ignition equal to the cell's risk
+        chance = risk_model(
+            temperature   = raster_values(temperature, candidates),
+            soil_moisture = raster_values(soil_moisture, candidates),
+            wind_speed    = raster_values(wind_speed, candidates),
+            humidity      = raster_values(humidity, candidates)
+        ) / 100
+        ignites = rng.random(candidates.size) < 1 - (1 - chance) ** touching
+
+        # The current fire burns out and the newly lit cells start burning
+        cells[burning] = BURNT
+        burnt += burning.size
+        burning = candidates[ignites]
+        cells[burning] = BURNING
+
+        history.append({"step": step + 1, "burning": int(burning.size), "burnt": burnt})
+
+    return grid, history
+
+
+# Works out how much forest is left after a fire (unburnt fuel cells).
+#
+# Parameters:
+#   grid          - the grid returned by simulate_fire_spread
+#   cell_hectares - the area of one grid cell in hectares
+#
+# Returns: remaining forest area in hectares
+def remaining_forest_cover(grid, cell_hectares=1.0):
+    return int(np.count_nonzero(grid == FUEL)) * cell_hectares
+
+
+# ── REAL WEATHER DATA ─────────────────────────────────────────────────────────
+# Scores fire risk from recorded weather instead of made-up trends. Weather
+# files can hold years of hourly readings from many stations — far too much to
+# load at once — so each file is read a chunk of rows at a time. Every chunk is
+# scored with the fire risk model in one NumPy calculation, then added to
+# running daily totals for each station.
+#
+# Each file needs a header row with these columns (extra columns are ignored):
+#   station, timestamp, temperature, soil_moisture, wind_speed, humidity
+# The timestamp must start with the date as YYYY-MM-DD (e.g. 2024-07-01T13:00).
+# Rows with a broken timestamp or value, or bytes that aren't valid UTF-8, are
+# skipped and counted.
+WEATHER_COLUMNS = ["station", "timestamp", "temperature", "soil_moisture", "wind_speed", "humidity"]
+
+
+# Converts a column of text to numbers. Blank or broken values become NaN
+# (not a number) so that row can be skipped instead of stopping the run.
+def parse_numbers(values):
+    try:
+        return np.array(values, dtype=float)
+    except ValueError:
+        numbers = np.empty(len(values))
+        for index, value in enumerate(values):
+            try:
+                numbers[index] = float(value)
+            except ValueError:
+                numbers[index] = np.nan
+        return numbers
+
+
+# The date at the start of each timestamp, e.g. "2024-07-01" from
+# "2024-07-01T13:00". A timestamp that doesn't start with a real YYYY-MM-DD
+# date (followed by nothing, "T" or a space) gives an empty date instead.
+DATE_PREFIX = re.compile(r"\d{4}-\d{2}-\d{2}(?=$|[T ])")
+
+
+def parse_dates(timestamps):
+    dates = [match.group() if (match := DATE_PREFIX.match(timestamp.strip())) else ""
+             for timestamp in timestamps]
+    try:
+        np.array([date for date in dates if date], dtype="datetime64[D]")
+    except ValueError:
+        # Some date is in the right format but doesn't exist, e.g. 2024-02-30
+        for index, date in enumerate(dates):
+            try:
+                if date:
+                    np.datetime64(date, "D")
+            except ValueError:
+                dates[index] = ""
+    return dates
+
+
+# Reads one weather file and adds up fire risk per station per day
+# (one job for map_jobs).
+#
+# Returns: (totals, skipped_rows) where totals maps (station, date) to
+#          [readings, sum of risk, highest risk, readings above the threshold]
+def daily_risk_totals(risk_model, path, threshold=75, chunk_size=100_000):
+    totals = {}
+    skipped = 0
+
+    # Bytes that aren't valid UTF-8 become "\ufffd" instead of stopping the
+    # whole file; the rows they are in are skipped below
+    with open(path, newline="", encoding="utf-8", errors="replace") as weather_file:
+        reader = csv.reader(weather_file)
+        header = [name.strip() for name in next(reader)]
+        missing = [name for name in WEATHER_COLUMNS if name not in header]
+        if missing:
+            raise ValueError(f"{path} is missing the column(s): {', '.join(missing)}")
+        positions = [header.index(name) for name in WEATHER_COLUMNS]
+        width = max(positions) + 1
+
+        while True:
+            chunk = list(islice(reader, chunk_size))
+            if not chunk:
+                break
+
+            # Rows with missing columns are skipped (blank lines are ignored)
+            rows = [row for row in chunk if len(row) >= width]
+            skipped += sum(1 for row in chunk if row and len(row) < width)
+            if not rows:
+                continue
+            stations, timestamps, *weather = ([row[position] for row in rows] for position in positions)
+            temperature, soil_moisture, wind_speed, humidity = (parse_numbers(column) for column in weather)
+
+            dates = np.array(parse_dates(timestamps), dtype=str)
+            stations = np.array(stations, dtype=str)
+
+            # A broken number or date already fails to parse; a broken station
+            # name is caught by its replacement character
+            risk = risk_model(temperature, soil_moisture, wind_speed, humidity)
+            valid = ~np.isnan(risk) & (dates != "") & (np.char.find(stations, "\ufffd") < 0)
+            skipped += int(np.count_nonzero(~valid))
+
+            # Group the chunk's readings by (station, date) and total each group
+            keys = np.char.add(np.char.add(stations, "|"), dates)[valid]
+            risk = risk[valid]
+            groups, group_of_row = np.unique(keys, return_inverse=True)
+            counts = np.bincount(group_of_row, minlength=groups.size)
+            sums = np.bincount(group_of_row, weights=risk, minlength=groups.size)
+            above = np.bincount(group_of_row, weights=risk > threshold, minlength=groups.size)
+            highest = np.full(groups.size, -np.inf)
+            np.maximum.at(highest, group_of_row, risk)
+
+            for key, count, total, peak, hot in zip(groups.tolist(), counts, sums, highest, above):
+                station, date = key.rsplit("|", 1)
+                entry = totals.setdefault((station, date), [0, 0.0, -np.inf, 0])
+                entry[0] += int(count)
+                entry[1] += float(total)
+                entry[2] = max(entry[2], float(peak))
+                entry[3] += int(hot)
+
+    return totals, skipped
+
+
+# Scores many weather files in parallel and combines the daily totals.
+#
+# Parameters:
+#   risk_model - the fire risk function, e.g. calculate_fire_risk
+#   paths      - the weather CSV files (e.g. one per station or per year)
+#   threshold  - risk score counted as dangerous
+#   workers    - number of processes to use (None = one per CPU core)
+#   chunk_size - how many rows are read and scored at a time
+#
+# Returns: (daily, skipped)
+#   daily   - a list of dictionaries, one per station per day, sorted by station
+#             then date, with "readings", "mean_risk", "max_risk" and "readings_above"
+#   skipped - how many rows across all files had missing or broken values
+#             or a timestamp that does not start with a YYYY-MM-DD date
+@traced("simulate")
+def load_daily_fire_risk(risk_model, paths, threshold=75, workers=None, chunk_size=100_000):
+    jobs = [(risk_model, path, threshold, chunk_size) for path in paths]
+
+    # Combine in file order; a station's day may be split across files
+    combined = {}
+    skipped = 0
+    for totals, file_skipped in map_jobs(daily_risk_totals, jobs, workers):
+        skipped += file_skipped
+        for key, (count, total, peak, hot) in totals.items():
+            entry = combined.setdefault(key, [0, 0.0, -np.inf, 0])
+            entry[0] += count
+            entry[1] += total
+            entry[2] = max(entry[2], peak)
+            entry[3] += hot
+
+    daily = [
+        {
+            "station":        station,
+            "date":           date,
+            "readings":       count,
+            "mean_risk":      round(total / count, 1),
+            "max_risk":       round(peak, 1),
+            "readings_above": hot,
+        }
+        for (station, date), (count, total, peak, hot) in sorted(combined.items())
+    ]
+    return daily, skipped
+
+
+# ── LOGGING PARAMETER SWEEPS ──────────────────────────────────────────────────
+# For policy questions we want to try every combination of logging rate,
+# conservation factor and starting forest cover — often millions of them.
+# The sweep repeats simulate_logging's multiplication once per period, but for
+# every combination at once with NumPy, split into chunks that run on separate
+# CPU cores. Compound loss also has a formula:
+#   cover after t periods = cover × (1 - logging_rate × (1 - conservation_factor))^t
+# but it can differ from the loop in the last decimal place, which changes the
+# rounded cover (and so the period a threshold is crossed) whenever the cover
+# sits near a halfway point such as 1714.75. The sweep therefore never uses it.
+
+
+# The unrounded cover after each period, for every grid point at once, worked
+# out exactly like simulate_logging (same operations in the same order).
+#
+# Yields: one array per period, periods 1 to periods
+def compound_covers(initial_covers, logging_rates, conservation_factors, periods):
+    logging_rates = np.asarray(logging_rates, dtype=float)
+    conservation_factors = np.asarray(conservation_factors, dtype=float)
+    current_cover, effective_logging_rate = np.broadcast_arrays(
+        np.asarray(initial_covers, dtype=float), logging_rates * (1 - conservation_factors)
+    )
+    for period in range(periods):
+        current_cover = current_cover * (1 - effective_logging_rate)
+        yield current_cover
+
+
+# Forest cover for every grid point and every period, rounded like simulate_logging.
+#
+# Parameters:
+#   initial_covers, logging_rates,
+#   conservation_factors - arrays of the same length, one grid point each
+#   periods              - number of periods to simulate
+#   method               - "compound" repeats simulate_logging's multiplication
+#                          each period (matches it bit for bit); "closed_form" uses
+#                          the formula, which can differ in the last decimal place
+#
+# Returns: a (grid points × periods) array
+def logging_cover_grid(initial_covers, logging_rates, conservation_factors, periods,
+                       method="compound"):
+    if method == "compound":
+        grid = [np.ravel(initial_covers), np.ravel(logging_rates), np.ravel(conservation_factors)]
+        cover = np.empty((np.broadcast(*grid).size, periods))
+        for period, period_cover in enumerate(compound_covers(*grid, periods)):
+            cover[:, period] = period_cover
+    elif method == "closed_form":
+        initial_covers = np.asarray(initial_covers, dtype=float).reshape(-1, 1)
+        effective_logging_rate = (np.asarray(logging_rates, dtype=float)
+                                  * (1 - np.asarray(conservation_factors, dtype=float))).reshape(-1, 1)
+        cover = initial_covers * (1 - effective_logging_rate) ** np.arange(1, periods + 1)
+    else:
+        raise ValueError(f"unknown method {method!r} (expected 'compound' or 'closed_form')")
+
+    return round_tenths(cover)
+
+
+# Works out, for one chunk of grid points, the final cover and the first period
+# in which the (rounded) cover drops below each threshold (one job for map_jobs).
+# Only the current period is kept in memory, however many periods there are.
+#
+# Returns: a dictionary of arrays, one value per grid point
+def sweep_logging_chunk(initial_covers, logging_rates, conservation_factors, periods, thresholds):
+    final_cover = round_tenths(initial_covers)  # if there are no periods at all
+    first_below = {threshold: np.full(initial_covers.size, -1) for threshold in thresholds}
+
+    covers = compound_covers(initial_covers, logging_rates, conservation_factors, periods)
+    for period, cover in enumerate(covers, start=1):
+        final_cover = round_tenths(cover)
+        for threshold, below in first_below.items():
+            below[(below < 0) & (final_cover < threshold)] = period
+
+    result = {
+        "logging_rate":         logging_rates,
+        "conservation_factor":  conservation_factors,
+        "initial_forest_cover": initial_covers,
+        "final_cover":          final_cover,
+    }
+    # -1 means the cover never drops below the threshold within the periods
+    for threshold, below in first_below.items():
+        result[f"periods_below_{threshold:g}"] = below
+    return result
+
+
+# Parameters:
+#   logging_rates        - list of logging rates to try (e.g. np.linspace(0.01, 0.2, 100))
+#   conservation_factors - list of conservation factors to try
+#   initial_covers       - list of starting forest covers to try
+#   periods              - number of periods to simulate
+#   thresholds           - cover levels X for the "periods until cover drops below X" columns
+#   output_path          - optional CSV file to write the results table to
+#   workers              - number of processes to use (None = one per CPU core)
+#   chunk_size           - how many grid points each process handles at once
+#
+# Returns: the results table as a dictionary of arrays (one row per grid point),
+#          or the number of rows written if output_path is given
+@traced("simulate", steps="periods")
+def sweep_logging(logging_rates, conservation_factors, initial_covers, periods,
+                  thresholds=(5000,), output_path=None, workers=None, chunk_size=250_000):
+    # Every combination of the three parameters, as three flat arrays
+    grid = [column.ravel() for column in np.meshgrid(
+        np.asarray(logging_rates, dtype=float),
+        np.asarray(conservation_factors, dtype=float),
+        np.asarray(initial_covers, dtype=float),
+        indexing="ij"
+    )]
+    rates, factors, covers = grid
+    jobs = [(covers[start:start + chunk_size], rates[start:start + chunk_size],
+             factors[start:start + chunk_size], periods, tuple(thresholds))
+            for start in range(0, rates.size, chunk_size)]
+
+    def write_or_collect(results):
+        if output_path is None:
+            chunks = list(results)
+            if not chunks:
+                return {}
+            return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+        rows = 0
+        with open(output_path, "w", newline="") as output_file:
+            for number, chunk in enumerate(results):
+                names = list(chunk)
+                if number == 0:
+                    output_file.write(",".join(names) + "\n")
+                columns = [chunk[name] for name in names]
+                formats = ["%d" if column.dtype.kind == "i" else "%.10g" for column in columns]
+                np.savetxt(output_file, np.column_stack(columns), fmt=formats, delimiter=",")
+                rows += len(columns[0])
+        return rows
+
+    return write_or_collect(map_jobs(sweep_logging_chunk, jobs, workers))
@@ -0,0 +1,210 @@
+# ----------------------------------------
+# Modelling - Optional timing trace
+# ----------------------------------------
+#
+# When a run is slow, this shows where the time went: running the models
+# ("simulate"), building the pygal charts ("build") or writing the SVG files
+# ("render"). Every model call is recorded with its parameters, how many steps
+# it ran for and how big its output was.
+#
+# Tracing is off unless the MODEL_TRACE environment variable names a file:
+#   MODEL_TRACE=trace.json python "1. Human population.py"
+# The dice programs (9.1 and 9.2) are traced too when this folder is on their
+# import path:
+#   PYTHONPATH=../Pygal MODEL_TRACE=trace.json python main.py
+# The trace is written when the program finishes. By default it is a Chrome
+# trace: open chrome://tracing (or https://ui.perfetto.dev) and load the file
+# to see a timeline. Set MODEL_TRACE_FORMAT=json for a plain JSON summary.
+#
+# When tracing is off, traced() hands back the original function untouched and
+# span() does nothing, so the models run at full speed.
+
+import atexit
+import contextlib
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+TRACE = {
+    "enabled": False,
+    "path": None,
+    "format": "chrome",
+    "events": [],
+    "start": time.perf_counter(),
+}
+
+NO_SPAN = contextlib.nullcontext()
+
+
+# Turns tracing on and writes the trace to path when the program ends.
+# Must be called before the model scripts are loaded, because functions are
+# only wrapped for tracing while tracing is on.
+def enable(path, trace_format=None):
+    if not TRACE["enabled"]:
+        atexit.register(write_trace)
+    TRACE["enabled"] = True
+    TRACE["path"] = path
+    TRACE["format"] = trace_format or os.environ.get("MODEL_TRACE_FORMAT", "chrome")
+
+
+# ── DESCRIBING CALLS ──────────────────────────────────────────────────────────
+# How big a result is: the number of values in an array or list. A tuple of
+# results (e.g. a grid and its history) gives the size of each part. Anything
+# else, such as a summary dictionary or a single number, gives None.
+def output_size(result):
+    if isinstance(result, np.ndarray):
+        return int(result.size)
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        return [output_size(part) for part in result]
+    return None
+
+
+# Keeps the parameters that are worth showing in a trace: numbers and text as
+# they are, arrays as their shape. Anything else is left out.
+def describe_arguments(arguments):
+    described = {}
+    for name, value in arguments.items():
+        if isinstance(value, (bool, int, float, str)) or value is None:
+            described[name] = value
+        elif hasattr(value, "shape"):
+            described[name] = f"array{tuple(value.shape)}"
+        elif isinstance(value, (list, tuple)):
+            described[name] = f"{type(value).__name__}[{len(value)}]"
+    return described
+
+
+def add_event(name, stage, start, end, details):
+    TRACE["events"].append({
+        "name": name,
+        "stage": stage,
+        "start": start - TRACE["start"],
+        "seconds": end - start,
+        "thread": threading.get_ident(),
+        "details": details,
+    })
+
+
+# ── TRACING FUNCTIONS AND BLOCKS ──────────────────────────────────────────────
+# Decorator that records every call of a model function.
+#
+# Parameters:
+#   stage  - "simulate", "build" or "render"
+#   steps  - the name of the parameter that holds the step count (e.g. "years"),
+#            so each event shows how many steps the call ran for
+#   output - the name of the parameter that holds the file the function writes,
+#            so each event shows the size of that file
+#
+# A call that fails is still recorded, with the error in its details.
+def traced(stage, steps=None, output=None):
+    def decorate(function):
+        if not TRACE["enabled"]:
+            return function
+
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            details = {"params": describe_arguments(bound.arguments)}
+            if steps is not None:
+                details["steps"] = bound.arguments[steps]
+
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+                details["output_size"] = output_size(result)
+                return result
+            except BaseException as error:
+                details["error"] = type(error).__name__
+                raise
+            finally:
+                end = time.perf_counter()
+                path = bound.arguments.get(output) if output is not None else None
+                if path is not None and os.path.exists(path):
+                    details["output_file"] = path
+                    details["output_bytes"] = os.path.getsize(path)
+                add_event(function.__name__, stage, start, end, details)
+
+        return wrapper
+    return decorate
+
+
+@contextlib.contextmanager
+def timed_block(name, stage, output, details):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if output is not None and os.path.exists(output):
+            details["output_file"] = output
+            details["output_bytes"] = os.path.getsize(output)
+        add_event(name, stage, start, end, details)
+
+
+# Records how long a block of code takes, for steps that aren't a single
+# function call (e.g. building a chart):
+#   with span("build line chart", "build"):
+#       ...
+# If output names a file, its size after the block is recorded too.
+def span(name, stage, output=None, **details):
+    if not TRACE["enabled"]:
+        return NO_SPAN
+    return timed_block(name, stage, output, details)
+
+
+# ── WRITING THE TRACE ─────────────────────────────────────────────────────────
+# Chrome trace format: one "complete" event per call, times in microseconds.
+def chrome_trace():
+    return {
+        "displayTimeUnit": "ms",
+        "traceEvents": [{
+            "name": event["name"],
+            "cat": event["stage"],
+            "ph": "X",
+            "ts": event["start"] * 1e6,
+            "dur": event["seconds"] * 1e6,
+            "pid": os.getpid(),
+            "tid": event["thread"],
+            "args": event["details"],
+        } for event in TRACE["events"]],
+    }
+
+
+# Plain JSON: the events, plus the number of calls and total time per stage
+# and per function.
+def json_trace():
+    stages = {}
+    functions = {}
+    for event in TRACE["events"]:
+        for totals, key in ((stages, event["stage"]), (functions, event["name"])):
+            entry = totals.setdefault(key, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += event["seconds"]
+    return {"stages": stages, "functions": functions, "events": TRACE["events"]}
+
+
+# NumPy numbers (e.g. a step count taken from an array) become plain numbers
+def json_value(value):
+    return value.item() if hasattr(value, "item") else repr(value)
+
+
+def write_trace(path=None):
+    path = path or TRACE["path"]
+    if path is None:
+        return
+    trace = json_trace() if TRACE["format"] == "json" else chrome_trace()
+    with open(path, "w", encoding="utf-8") as trace_file:
+        json.dump(trace, trace_file, default=json_value)
+
+
+if os.environ.get("MODEL_TRACE"):
+    enable(os.environ["MODEL_TRACE"])
@@ -0,0 +1,198 @@
+# ----------------------------------------
+# Pygal Modelling - Result cache
+# ----------------------------------------
+#
+# Running a script twice with the same scenarios gives exactly the same
+# numbers and the same chart, so there is no need to do the work again.
+# This cache saves simulation results and rendered SVG charts on disk, under a
+# name made from a hash ("fingerprint") of everything that affects them:
+#   - the source code of the model function(s)
+#   - the parameters passed to the model
+#   - for charts, the source of the whole lesson script and of downsampling.py,
+#     so editing a scenario, a label or the chart code draws a new chart
+# Change any of these and the fingerprint changes, so stale results are never
+# reused. When the cache grows past its size limit, the least recently used
+# files are deleted first.
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+from importlib import metadata
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = ".model_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+
+
+# Creates the cache folder (if needed) and returns a dictionary describing the
+# cache, including hit and miss counters for this run.
+# Set the MODEL_CACHE environment variable to "off" to turn caching off.
+def open_cache(directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+    enabled = os.environ.get("MODEL_CACHE", "on").lower() not in ("off", "0", "false")
+    if enabled:
+        os.makedirs(directory, exist_ok=True)
+    return {
+        "directory": directory,
+        "max_bytes": max_bytes,
+        "enabled": enabled,
+        "hits": 0,
+        "misses": 0,
+    }
+
+
+# ── FINGERPRINTS ──────────────────────────────────────────────────────────────
+# The source code of a function or a whole module, so that editing the model
+# changes the key. Falls back to the compiled bytecode if the source of a
+# function isn't available.
+def function_fingerprint(function):
+    try:
+        return inspect.getsource(function)
+    except (OSError, TypeError):
+        code = getattr(function, "__code__", None)
+        if code is None:  # a module without a source file
+            return function.__name__
+        return code.co_code.hex() + repr(code.co_consts)
+
+
+# Builds the cache key from the model function(s) or module(s) and any
+# parameters or chart settings. Parameters must be JSON-friendly (numbers,
+# text, lists, dicts).
+#
+# Returns: a hexadecimal SHA-256 hash
+def cache_key(functions, *parts):
+    if not isinstance(functions, (list, tuple)):
+        functions = [functions]
+    payload = {
+        "functions": [function_fingerprint(function) for function in functions],
+        "parts": parts,
+    }
+    text = json.dumps(payload, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# The installed pygal version, so upgrading pygal re-renders the charts.
+# Read from the package metadata so that pygal itself doesn't get imported.
+def pygal_version():
+    try:
+        return metadata.version("pygal")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+# A line for the end of a run, e.g. "Cache: 3 hits, 1 miss"
+def cache_summary(cache):
+    if not cache["enabled"]:
+        return "Cache: off"
+    hits, misses = cache["hits"], cache["misses"]
+    return f"Cache: {hits} hit{'s' * (hits != 1)}, {misses} miss{'es' * (misses != 1)}"
+
+
+def entry_path(cache, key, extension):
+    return os.path.join(cache["directory"], key + extension)
+
+
+# Marks an entry as recently used (the LRU order is based on modification time)
+def touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# Moves a finished temporary file into place, so a half-written file is never
+# mistaken for a cache entry.
+def commit_file(cache, temporary_path, path):
+    os.replace(temporary_path, path)
+    evict(cache)
+
+
+# ── LEAST-RECENTLY-USED EVICTION ──────────────────────────────────────────────
+# Deletes the oldest entries until the cache fits in max_bytes again
+def evict(cache):
+    entries = []
+    for entry in os.scandir(cache["directory"]):
+        if entry.is_file() and not entry.name.startswith("."):
+            status = entry.stat()
+            entries.append((status.st_mtime, status.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= cache["max_bytes"]:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+# ── CACHED SIMULATION RESULTS ─────────────────────────────────────────────────
+# Returns the saved result for this key, or runs compute() and saves its result.
+# Results are stored as NumPy .npy files: compact binary that keeps whole
+# numbers as whole numbers and decimals as decimals.
+#
+# Parameters:
+#   cache     - the dictionary from open_cache()
+#   functions - the model function(s) the result depends on
+#   params    - the parameters given to the model
+#   compute   - a function with no arguments that runs the simulation
+#
+# Returns: the result as a list
+def cached_series(cache, functions, params, compute):
+    if not cache["enabled"]:
+        return compute()
+
+    path = entry_path(cache, cache_key(functions, params), ".npy")
+    try:
+        values = np.load(path, allow_pickle=False).tolist()
+        touch(path)
+        cache["hits"] += 1
+        return values
+    except (OSError, ValueError):
+        pass
+
+    cache["misses"] += 1
+    values = compute()
+    array = np.asarray(values)
+    if array.dtype == object:
+        return values  # e.g. whole numbers too big for a NumPy integer: don't cache
+
+    handle, temporary_path = tempfile.mkstemp(dir=cache["directory"], prefix=".", suffix=".npy")
+    with os.fdopen(handle, "wb") as temporary_file:
+        np.save(temporary_file, array, allow_pickle=False)
+    commit_file(cache, temporary_path, path)
+    return values
+
+
+# ── CACHED CHARTS ─────────────────────────────────────────────────────────────
+# If an SVG with this key is cached, copies it to output_path and returns True.
+# Otherwise returns False, and the caller builds and renders the chart.
+def restore_svg(cache, key, output_path):
+    if not cache["enabled"]:
+        return False
+
+    path = entry_path(cache, key, ".svg")
+    try:
+        shutil.copyfile(path, output_path)
+    except OSError:
+        cache["misses"] += 1
+        return False
+
+    touch(path)
+    cache["hits"] += 1
+    return True
+
+
+# Saves a freshly rendered SVG in the cache under this key
+def store_svg(cache, key, output_path):
+    if not cache["enabled"]:
+        return
+
+    handle, temporary_path = tempfile.mkstemp(dir=cache["directory"], prefix=".", suffix=".svg")
+    os.close(handle)
+    shutil.copyfile(output_path, temporary_path)
+    commit_file(cache, temporary_path, entry_path(cache, key, ".svg"))
@@ -0,0 +1,77 @@
+# ----------------------------------------
+# Pygal Modelling - Using several CPU cores
+# ----------------------------------------
+#
+# The big simulations (tipping points, weather ensembles, real weather files,
+# logging sweeps) split their work into independent "jobs" and run them on
+# separate CPU cores. They all do it through map_jobs() below.
+#
+# A worker must be a function defined at the top level of a module, so that
+# the other processes can find it by name. The lesson scripts have spaces in
+# their file names and can't be imported normally, so tools that use them
+# (cli.py, the benchmarks) load them with load_script(). Every worker process
+# loads the same scripts before it starts, so functions from a lesson (e.g.
+# calculate_fire_risk passed to an engine) work in the workers too, however
+# new processes are started ("fork" on Linux, "spawn" on Windows and macOS).
+
+import importlib.util
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# The scripts loaded with load_script(): module name -> file path
+SCRIPT_PATHS = {}
+
+
+# Loads a Python file as a module with the given name, so that other code
+# (and pickle) can find it as sys.modules[name]. The file's folder is added to
+# the import path, so it can import the helper modules next to it.
+#
+# Returns: the loaded module
+def load_script(name, path):
+    if name in sys.modules:
+        return sys.modules[name]
+
+    folder = os.path.dirname(os.path.abspath(path))
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    SCRIPT_PATHS[name] = path
+    return module
+
+
+# Runs first in every worker process: loads the scripts the main process loaded
+def load_scripts(paths):
+    for name, path in paths.items():
+        load_script(name, path)
+
+
+# Runs worker(*job) for every job and hands back the results in job order, one
+# at a time, so a caller can write each result out before the next one arrives.
+# With a single job, or workers=1, everything runs in this process: starting
+# extra processes isn't worth it.
+#
+# Parameters:
+#   worker  - the function each job runs
+#   jobs    - a list of argument tuples, one per job
+#   workers - number of processes to use (None = one per CPU core)
+#
+# Yields: the result of each job, in the same order as jobs
+def map_jobs(worker, jobs, workers=None):
+    jobs = list(jobs)
+    if len(jobs) <= 1 or workers == 1:
+        for job in jobs:
+            yield worker(*job)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_scripts,
+                             initargs=(dict(SCRIPT_PATHS),)) as pool:
+        yield from pool.map(worker, *zip(*jobs))
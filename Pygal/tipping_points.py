@@ -0,0 +1,129 @@
+# ----------------------------------------
+# Pygal Modelling - Fish tipping points
+# ----------------------------------------
+#
+# Goes with "2. Fish Population.py". The fish model itself is passed in
+# (rateModel, normally fishModel), so the lesson keeps the only copy of it.
+
+import numpy as np
+
+from instrumentation import traced
+from parallel import map_jobs
+
+
+# ── TIPPING POINT FINDER ──────────────────────────────────────────────────────
+# The "tipping point" is the smallest harvest rate that makes the population
+# collapse (reach zero) before the simulation ends. Instead of editing the
+# scenarios by hand, this finds it automatically using bisection:
+#   - start with a harvest rate that is known to be safe (0) and one that is
+#     known to cause collapse
+#   - try the harvest rate halfway between them, and keep whichever half still
+#     contains the tipping point
+#   - repeat until the two rates are closer together than the tolerance
+# Every initial population is bisected at the same time as one NumPy array, and
+# large sweeps are split into chunks that run on separate CPU cores.
+#
+# The answer can be checked against the maths of the logistic model. The most
+# fish that can ever be harvested forever is r·K/4 (the growth rate at K/2). A
+# population starting below K/2 can only survive a harvest up to r·P0·(1 - P0/K),
+# its own growth rate. Given long enough, any harvest above that bound causes
+# collapse — so over a finite time the tipping point can only be higher.
+
+# Steps every population forward with Euler's method (like runFishBatch in the
+# lesson) but only keeps the latest value. Zero is permanent once reached, so a
+# final value of zero means the population collapsed at some point during the run.
+def collapsesWithin(rateModel, initialPopulations, harvestRates, growthRate, carryingCapacity,
+                    timeStep, numSteps):
+    population = np.array(initialPopulations, dtype=float)
+    for step in range(numSteps):
+        population = np.maximum(
+            population + timeStep * rateModel(population, growthRate, carryingCapacity, harvestRates),
+            0
+        )
+    return population == 0
+
+
+# Bisects the tipping point for one chunk of initial populations.
+# This is one job for map_jobs (see parallel.py).
+def bisectTippingPoints(rateModel, initialPopulations, growthRate, carryingCapacity,
+                        totalTime, timeStep, tolerance):
+    initialPopulations = np.asarray(initialPopulations, dtype=float)
+    numSteps = int(totalTime / timeStep)
+    simulatedTime = numSteps * timeStep  # can be a little less than totalTime
+    if numSteps == 0:
+        # Nothing is simulated, so no harvest can collapse a living population
+        return np.where(initialPopulations <= 0, 0.0, np.nan)
+
+    # A harvest of 0 never collapses a living population. Above r·K/4 the
+    # population shrinks by at least (harvest - r·K/4) per unit of time and
+    # can never be larger than max(P0, K), so this upper harvest should collapse.
+    low = np.zeros_like(initialPopulations)
+    high = np.full_like(initialPopulations, growthRate * carryingCapacity / 4)
+    high += np.maximum(initialPopulations, carryingCapacity) / simulatedTime * 1.01
+
+    # Euler steps only follow the maths approximately, so check that it really
+    # does. Populations where it doesn't have no tipping point in the bracket:
+    # they are left out of the bisection and reported as NaN.
+    bracketed = collapsesWithin(rateModel, initialPopulations, high, growthRate,
+                                carryingCapacity, timeStep, numSteps)
+    high = np.where(bracketed, high, 0.0)
+
+    while np.max(high - low, initial=0) > tolerance:
+        middle = (low + high) / 2
+        collapsed = collapsesWithin(rateModel, initialPopulations, middle, growthRate,
+                                    carryingCapacity, timeStep, numSteps)
+        high = np.where(collapsed, middle, high)
+        low = np.where(collapsed, low, middle)
+
+    # A population that starts at zero has already collapsed
+    return np.where(initialPopulations <= 0, 0.0, np.where(bracketed, high, np.nan))
+
+
+# Parameters:
+#   rateModel          - the fish model, e.g. fishModel(population, growthRate,
+#                        carryingCapacity, harvestRate); it must work on NumPy arrays
+#   growthRate         - how fast the fish reproduce
+#   carryingCapacity   - the maximum population the environment can support
+#   initialPopulations - the starting populations to test (e.g. np.linspace(1, 100, 5000))
+#   totalTime          - how long each simulation runs
+#   timeStep           - Euler time step, the same as the chart simulation uses
+#   tolerance          - how precisely each tipping point is found
+#   workers            - number of processes to use (None = one per CPU core)
+#   chunkSize          - how many initial populations each process handles at once
+#
+# Returns: a dictionary of arrays, one entry per initial population:
+#   "initial_population" - the starting population
+#   "tipping_point"      - the smallest harvest rate that causes collapse, or NaN
+#                          if no harvest was found to collapse it within the
+#                          simulated time (e.g. totalTime shorter than one timeStep)
+#   "analytic_bound"     - the long-run harvest limit from the formula above
+#   "consistent"         - True where a tipping point was found and is not below
+#                          the analytic bound
+@traced("simulate")
+def findTippingPoints(rateModel, growthRate, carryingCapacity, initialPopulations, totalTime,
+                      timeStep=0.1, tolerance=1e-6, workers=None, chunkSize=1000):
+    initialPopulations = np.ravel(np.asarray(initialPopulations, dtype=float))
+    chunks = [initialPopulations[start:start + chunkSize]
+              for start in range(0, initialPopulations.size, chunkSize)]
+
+    jobs = [(rateModel, chunk, growthRate, carryingCapacity, totalTime, timeStep, tolerance)
+            for chunk in chunks]
+    results = list(map_jobs(bisectTippingPoints, jobs, workers))
+
+    tippingPoints = np.concatenate(results) if results else np.empty(0)
+
+    # Long-run bound: r·P0·(1 - P0/K) below K/2, and r·K/4 from K/2 upwards
+    halfCapacity = carryingCapacity / 2
+    analyticBound = np.where(
+        initialPopulations < halfCapacity,
+        growthRate * initialPopulations * (1 - initialPopulations / carryingCapacity),
+        growthRate * carryingCapacity / 4
+    )
+    analyticBound = np.maximum(analyticBound, 0)
+
+    return {
+        "initial_population": initialPopulations,
+        "tipping_point": tippingPoints,
+        "analytic_bound": analyticBound,
+        "consistent": tippingPoints >= analyticBound - 2 * tolerance,
+    }
@@ -0,0 +1,164 @@
+# ----------------------------------------
+# Benchmarks - equivalence checks
+# ----------------------------------------
+#
+# The fast engines (NumPy batches, closed formulas, parameter sweeps) promise
+# the same numbers as the simple loops in the lessons. This script runs both
+# on the same inputs and compares them, so a speed-up that changes a result is
+# caught before it reaches a chart. The inputs include awkward cases such as
+# extinction and values that sit exactly halfway between two rounded results.
+#
+# Examples:
+#   python check_equivalence.py
+#   python check_equivalence.py --only fish_batch --only population_batch
+#
+# Exits with status 1 if any check finds a difference.
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PYGAL_DIR = os.path.join(ROOT, "Pygal")
+
+sys.path.insert(0, PYGAL_DIR)
+from parallel import load_script  # found through the Pygal folder added above
+
+SCRIPTS = {
+    "human":  os.path.join(PYGAL_DIR, "1. Human population.py"),
+    "fish":   os.path.join(PYGAL_DIR, "2. Fish Population.py"),
+    "forest": os.path.join(PYGAL_DIR, "3. Forestry Conservation Model.py"),
+}
+
+
+def load_lesson(name):
+    return load_script(f"equivalence_{name}", SCRIPTS[name])
+
+
+# ── THE CHECKS ────────────────────────────────────────────────────────────────
+# Each check compares an engine with the lesson's reference loop and returns a
+# list of problems (empty if everything matched).
+def check_fish_batch(modules):
+    fish = modules["fish"]
+    populations = [0, 1, 30, 50, 99.5, 100, 150]
+    harvests = [0, 5, 10, 12.5, 15, 40]  # 12.5 is r·K/4; 40 collapses every population
+    pairs = [(population, harvest) for population in populations for harvest in harvests]
+
+    batch = fish.runFishBatch([population for population, _ in pairs], [harvest for _, harvest in pairs],
+                              0.5, 100, 0.1, 300)
+
+    problems = []
+    for row, (population, harvest) in enumerate(pairs):
+        expected = fish.runFishScenario(population, harvest, 0.5, 100, 0.1, 300)
+        if batch[row].tolist() != expected:
+            problems.append(f"runFishBatch differs from runFishScenario for "
+                            f"population {population}, harvest {harvest}")
+    return problems
+
+
+# Growth rate 0.5 from 1, 3 or 5 people gives 1.5, 4.5, 7.5, ... in the first
+# years: exactly halfway, where round() goes to the even number.
+def check_population_batch(modules):
+    human = modules["human"]
+    populations = [1, 3, 5, 1000, 7_900_000_000]
+    rates = [0.5, -0.5, 0.0, 0.01, 0.023, 0.1]
+    pairs = [(population, rate) for population in populations for rate in rates]
+    years = 60
+
+    starts = [population for population, _ in pairs]
+    growth = [rate for _, rate in pairs]
+    compound = human.run_population_batch(starts, growth, years, method="compound")
+    points = human.run_population_batch(starts, growth, years, year_points=[1, 7, 60], method="compound")
+    closed = human.run_population_batch(starts, growth, years, method="closed_form")
+
+    problems = []
+    for row, (population, rate) in enumerate(pairs):
+        expected = human.run_population_model(population, rate, years)
+        where = f"population {population}, growth rate {rate}"
+        if compound[row].tolist() != expected:
+            problems.append(f"compound batch differs from run_population_model for {where}")
+        if points[row].tolist() != [expected[0], expected[6], expected[59]]:
+            problems.append(f"compound batch with year_points differs for {where}")
+        if list(human.iter_population_model(population, rate, years)) != expected:
+            problems.append(f"iter_population_model differs from run_population_model for {where}")
+
+        # The formula may be off by one after rounding, or in the last digits of huge values
+        allowed = np.maximum(1, 1e-12 * np.abs(expected))
+        if np.any(np.abs(closed[row] - expected) > allowed):
+            problems.append(f"closed-form batch is more than rounding away for {where}")
+    return problems
+
+
+# Starting covers 0.05 apart, so many periods land on or next to a halfway
+# point such as 1714.75. simulate_logging(2000, 0.05, 3) ends at 1714.8, which
+# a closed formula rounds to 1714.7.
+def check_logging_sweep(modules):
+    from forest_engines import logging_cover_grid, sweep_logging
+
+    forest = modules["forest"]
+    covers = (1000 + 0.05 * np.arange(4000)).tolist() + [2000]
+    rates = [0.03, 0.05, 0.1]
+    factors = [0.0, 0.4]
+    periods = 8
+    thresholds = (900, 1000, 1714.8, 1805)
+
+    table = sweep_logging(rates, factors, covers, periods, thresholds=thresholds,
+                          workers=1, chunk_size=5000)
+    grid = logging_cover_grid(table["initial_forest_cover"], table["logging_rate"],
+                              table["conservation_factor"], periods)
+
+    problems = []
+    for row in range(len(table["final_cover"])):
+        cover, rate, factor = (float(table[name][row])
+                               for name in ("initial_forest_cover", "logging_rate", "conservation_factor"))
+        expected = forest.simulate_logging(cover, rate, periods, factor)
+        where = f"cover {cover}, logging rate {rate}, conservation factor {factor}"
+
+        if grid[row].tolist() != expected:
+            problems.append(f"logging_cover_grid differs from simulate_logging for {where}")
+        if table["final_cover"][row] != expected[-1]:
+            problems.append(f"sweep_logging final_cover {table['final_cover'][row]} "
+                            f"is not {expected[-1]} for {where}")
+        for threshold in thresholds:
+            below = next((period for period, value in enumerate(expected, start=1) if value < threshold), -1)
+            if table[f"periods_below_{threshold:g}"][row] != below:
+                problems.append(f"sweep_logging periods_below_{threshold:g} is "
+                                f"{table[f'periods_below_{threshold:g}'][row]}, not {below}, for {where}")
+    return problems[:20] + ([f"... and {len(problems) - 20} more"] if len(problems) > 20 else [])
+
+
+CHECKS = {
+    "fish_batch":       (["fish"], check_fish_batch),
+    "population_batch": (["human"], check_population_batch),
+    "logging_sweep":    (["forest"], check_logging_sweep),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the fast engines against the lessons' loops.")
+    parser.add_argument("--only", action="append", choices=list(CHECKS),
+                        help="check to run (repeat for several; default: all)")
+    args = parser.parse_args(argv)
+
+    modules = {}
+    failed = False
+    for name in args.only or list(CHECKS):
+        needed, check = CHECKS[name]
+        for script in needed:
+            if script not in modules:
+                modules[script] = load_lesson(script)
+
+        problems = check(modules)
+        failed = failed or bool(problems)
+        print(f"{name}: {'FAILED' if problems else 'ok'}", file=sys.stderr)
+        for problem in problems:
+            print(f"  {problem}", file=sys.stderr)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
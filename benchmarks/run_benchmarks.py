@@ -0,0 +1,387 @@
+# ----------------------------------------
+# Benchmarks - every model at three sizes
+# ----------------------------------------
+#
+# Times each model (and pygal chart rendering) at a small, medium and large
+# size, so that speed-ups can be checked and slow-downs caught.
+# For every benchmark it records:
+#   - wall time     (the fastest of several repeats, in seconds; quick benchmarks
+#                    are repeated until they have run for at least --min-time)
+#   - throughput    (work items per second: model steps, rolls, guesses or points)
+#   - peak memory   (the most memory Python allocated during one run)
+#
+# Examples:
+#   python run_benchmarks.py --tier small
+#   python run_benchmarks.py --output baseline.json
+#   python run_benchmarks.py --baseline baseline.json --threshold 0.2
+#
+# When a baseline file (an earlier --output) is given, any benchmark that is
+# more than the threshold slower than before is reported as a regression and
+# the script exits with status 1. Only the medium and large tiers can fail the
+# run: small-tier benchmarks take milliseconds, so a slower small result is
+# printed as a warning instead. Benchmarks that take less than --min-seconds
+# both before and after are too quick to time reliably and are not compared.
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PYGAL_DIR = os.path.join(ROOT, "Pygal")
+
+sys.path.insert(0, PYGAL_DIR)
+from parallel import load_script  # found through the Pygal folder added above
+
+SCRIPTS = {
+    "human":   os.path.join(PYGAL_DIR, "1. Human population.py"),
+    "fish":    os.path.join(PYGAL_DIR, "2. Fish Population.py"),
+    "forest":  os.path.join(PYGAL_DIR, "3. Forestry Conservation Model.py"),
+    "dice":    os.path.join(ROOT, "9.1 Basic Dice Model", "main.py"),
+    "rolls":   os.path.join(ROOT, "9.2 600 Dice Rolls", "main.py"),
+}
+
+# How big each tier is:
+#   scenarios - how many scenarios each model runs
+#   steps     - how many steps (years, days, months) each scenario runs for
+#   guesses   - how many guesses go through the 9.1 check_guess() path
+#   rolls     - how many dice rolls the 9.2 roll generator makes
+#   points    - how many points each line of the rendered chart has
+TIERS = {
+    "small":  {"scenarios": 10,   "steps": 100,    "guesses": 1_000,     "rolls": 100_000,    "points": 100},
+    "medium": {"scenarios": 100,  "steps": 1_000,  "guesses": 100_000,   "rolls": 10_000_000, "points": 1_000},
+    "large":  {"scenarios": 1000, "steps": 10_000, "guesses": 1_000_000, "rolls": 100_000_000, "points": 100_000},
+}
+GATED_TIERS = ["medium", "large"]  # tiers whose regressions make the run fail
+
+
+# Loads a lesson script as a module (the file names contain spaces, so they are
+# loaded by path with parallel.load_script, which also lets worker processes
+# find them). The scripts only run their charts and experiments when run
+# directly, so loading them does no work.
+def load_lesson(name):
+    return load_script(f"benchmark_{name}", SCRIPTS[name])
+
+
+# Spreads the scenario parameters evenly between two values, e.g. growth rates
+# from 0.1% to 1% (kept small so 10,000 years of growth doesn't overflow).
+def spread(low, high, count):
+    return np.linspace(low, high, count).tolist()
+
+
+# ── THE BENCHMARKS ────────────────────────────────────────────────────────────
+# Each function sets up one benchmark for a tier and returns (run, items):
+#   run   - a function with no arguments that does the work being timed
+#   items - how many work items one call of run() processes
+def bench_population(modules, size):
+    rates = spread(0.001, 0.01, size["scenarios"])
+
+    def run():
+        for rate in rates:
+            modules["human"].run_population_model(1000, rate, size["steps"])
+
+    return run, size["scenarios"] * size["steps"]
+
+
+def bench_population_batch(modules, size):
+    populations = np.full(size["scenarios"], 1000.0)
+    rates = np.array(spread(0.001, 0.01, size["scenarios"]))
+
+    def run():
+        modules["human"].run_population_batch(populations, rates, size["steps"])
+
+    return run, size["scenarios"] * size["steps"]
+
+
+def bench_fish(modules, size):
+    harvests = spread(0, 15, size["scenarios"])
+
+    def run():
+        for harvest in harvests:
+            modules["fish"].runFishScenario(50, harvest, 0.5, 100, 0.1, size["steps"])
+
+    return run, size["scenarios"] * size["steps"]
+
+
+def bench_fish_batch(modules, size):
+    populations = np.full(size["scenarios"], 50.0)
+    harvests = np.array(spread(0, 15, size["scenarios"]))
+
+    def run():
+        modules["fish"].runFishBatch(populations, harvests, 0.5, 100, 0.1, size["steps"])
+
+    return run, size["scenarios"] * size["steps"]
+
+
+def bench_fire_risk(modules, size):
+    temperatures = spread(15, 30, size["scenarios"])
+
+    def run():
+        for temperature in temperatures:
+            modules["forest"].simulate_fire_risk(temperature, 60, 10, 50, size["steps"])
+
+    return run, size["scenarios"] * size["steps"]
+
+
+def bench_logging(modules, size):
+    factors = spread(0, 0.9, size["scenarios"])
+
+    def run():
+        for factor in factors:
+            modules["forest"].simulate_logging(10000, 0.05, size["steps"], factor)
+
+    return run, size["scenarios"] * size["steps"]
+
+
+def bench_dice_guess(modules, size):
+    guesses = [guess % 6 + 1 for guess in range(size["guesses"])]
+
+    def run():
+        for guess in guesses:
+            modules["dice"].check_guess(guess)
+
+    return run, size["guesses"]
+
+
+def bench_dice_rolls(modules, size):
+    rolls = modules["rolls"]
+
+    def run():
+        summary = rolls.new_summary()
+        for results, guesses, correct in rolls.generate_roll_chunks(size["rolls"], seed=1, user_guess=3):
+            rolls.update_summary(summary, results, correct)
+
+    return run, size["rolls"]
+
+
+# The CSV writer, streaming rolls to a temporary file. A tenth of the tier's
+# rolls, so the large tier writes about 120 MB rather than 1.2 GB.
+def bench_dice_csv(modules, size):
+    rolls = modules["rolls"]
+    count = size["rolls"] // 10
+
+    def run():
+        with tempfile.TemporaryDirectory() as folder:
+            rolls.stream_rolls_to_csv(os.path.join(folder, "rolls.csv"), count, seed=1, user_guess=3)
+
+    return run, count
+
+
+# ── THE BIGGER ENGINES ────────────────────────────────────────────────────────
+# These run on one CPU core (workers=1), so the timings measure the code itself
+# rather than how many cores the machine has.
+def bench_tipping_points(modules, size):
+    from tipping_points import findTippingPoints
+
+    populations = np.linspace(1, 100, size["scenarios"])
+
+    def run():
+        findTippingPoints(modules["fish"].fishModel, 0.5, 100, populations,
+                          totalTime=size["steps"] * 0.1, timeStep=0.1, workers=1)
+
+    return run, size["scenarios"] * size["steps"]
+
+
+# The adaptive integrator steps in plain Python, so it runs a tenth of the
+# scenarios (at least one).
+def bench_fish_adaptive(modules, size):
+    harvests = spread(0, 15, max(1, size["scenarios"] // 10))
+    time_points = [step * 0.1 for step in range(size["steps"] + 1)]
+
+    def run():
+        for harvest in harvests:
+            modules["fish"].runFishAdaptive(50, 0.5, 100, harvest, time_points)
+
+    return run, len(harvests) * size["steps"]
+
+
+def bench_fire_ensemble(modules, size):
+    from forest_engines import simulate_fire_risk_ensemble
+
+    def run():
+        simulate_fire_risk_ensemble(modules["forest"].calculate_fire_risk, 20, 60, 10, 50,
+                                    size["steps"], members=size["scenarios"], seed=1, workers=1)
+
+    return run, size["scenarios"] * size["steps"]
+
+
+# Every combination of the scenarios' logging rates with two conservation
+# factors, for one starting cover, stepped through every period
+def bench_sweep_logging(modules, size):
+    from forest_engines import sweep_logging
+
+    rates = spread(0, 0.5, size["scenarios"])
+
+    def run():
+        sweep_logging(rates, [0.0, 0.5], [10000], size["steps"], workers=1)
+
+    return run, 2 * size["scenarios"] * size["steps"]
+
+
+# Builds a pygal.Line chart with three lines and renders it to SVG text (in
+# memory, so disk speed doesn't count). Long lines are downsampled first, just
+# like in the lesson scripts.
+def bench_render(modules, size):
+    import pygal
+    from downsampling import add_series
+
+    series = [(f"Line {line}", np.cumsum(np.sin(np.arange(size["points"]) / (10 + line))).tolist())
+              for line in range(3)]
+    labels = [str(point) for point in range(size["points"])]
+
+    def run():
+        chart = pygal.Line(title="Benchmark", show_minor_x_labels=False)
+        add_series(chart, series, x_labels=labels)
+        chart.render()
+
+    return run, 3 * size["points"]
+
+
+BENCHMARKS = {
+    "population":       (["human"], bench_population),
+    "population_batch": (["human"], bench_population_batch),
+    "fish":             (["fish"], bench_fish),
+    "fish_batch":       (["fish"], bench_fish_batch),
+    "fire_risk":        (["forest"], bench_fire_risk),
+    "logging":          (["forest"], bench_logging),
+    "dice_guess":       (["dice"], bench_dice_guess),
+    "dice_rolls":       (["rolls"], bench_dice_rolls),
+    "dice_csv":         (["rolls"], bench_dice_csv),
+    "tipping_points":   (["fish"], bench_tipping_points),
+    "fish_adaptive":    (["fish"], bench_fish_adaptive),
+    "fire_ensemble":    (["forest"], bench_fire_ensemble),
+    "sweep_logging":    ([], bench_sweep_logging),
+    "render":           ([], bench_render),
+}
+
+
+# ── MEASURING ─────────────────────────────────────────────────────────────────
+# Times run() several times and keeps the fastest (the least disturbed by other
+# programs). A quick benchmark keeps repeating until the runs add up to at least
+# min_time seconds, so a single hiccup can't decide its result. Memory is
+# measured in a separate run, because tracking every allocation slows the code
+# down and would spoil the timing.
+def measure(run, items, repeats, min_time=0.2):
+    times = []
+    while len(times) < repeats or sum(times) < min_time:
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = min(times)
+    return {
+        "items": items,
+        "seconds": seconds,
+        "runs": len(times),
+        "items_per_second": items / seconds if seconds > 0 else None,
+        "peak_bytes": peak,
+    }
+
+
+def run_benchmarks(tiers, names, repeats=3, min_time=0.2):
+    modules = {}
+    results = {}
+    for tier in tiers:
+        for name in names:
+            needed, setup = BENCHMARKS[name]
+            try:
+                for script in needed:
+                    if script not in modules:
+                        modules[script] = load_lesson(script)
+                run, items = setup(modules, TIERS[tier])
+            except ImportError as error:  # e.g. pygal isn't installed
+                print(f"  {name} ({tier}): skipped - {error}", file=sys.stderr)
+                continue
+
+            result = measure(run, items, repeats, min_time)
+            results[f"{name}/{tier}"] = dict(name=name, tier=tier, **result)
+            print(f"  {name} ({tier}): {result['seconds']:.4f} s, "
+                  f"{result['items_per_second']:,.0f} items/s, "
+                  f"{result['peak_bytes'] / 1024:,.0f} KB peak", file=sys.stderr)
+    return results
+
+
+# ── COMPARING WITH A BASELINE ─────────────────────────────────────────────────
+# A benchmark has regressed if it now takes more than (1 + threshold) times as
+# long as it did in the baseline, e.g. threshold 0.1 allows 10% slower.
+# Benchmarks under min_seconds both times are skipped: at a fraction of a
+# millisecond the timer and the operating system make more difference than
+# the code does.
+#
+# Returns: a list of (key, baseline seconds, current seconds, ratio)
+def find_regressions(results, baseline, threshold, min_seconds=0.001):
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if previous is None or not previous["seconds"]:
+            continue
+        if max(previous["seconds"], result["seconds"]) < min_seconds:
+            continue
+        ratio = result["seconds"] / previous["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append((key, previous["seconds"], result["seconds"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every model at small, medium and large sizes.")
+    parser.add_argument("--tier", action="append", choices=list(TIERS),
+                        help="tier to run (repeat for several; default: all)")
+    parser.add_argument("--only", action="append", choices=list(BENCHMARKS),
+                        help="benchmark to run (repeat for several; default: all)")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per benchmark (the fastest is kept)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="keep repeating a benchmark until its runs add up to this many seconds")
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--baseline", help="JSON results from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="fraction slower than the baseline that counts as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.001,
+                        help="benchmarks faster than this (before and after) are not compared")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.tier or list(TIERS), args.only or list(BENCHMARKS),
+                             args.repeats, args.min_time)
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = find_regressions(results, baseline, args.threshold, args.min_seconds)
+        failed = False
+        for key, before, after, ratio in regressions:
+            gated = results[key]["tier"] in GATED_TIERS
+            failed = failed or gated
+            print(f"{'REGRESSION' if gated else 'warning: slower'} {key}: "
+                  f"{before:.4f} s -> {after:.4f} s ({ratio:.2f}x)", file=sys.stderr)
+        if failed:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()